@@ -153,4 +153,11 @@ CSRF_COOKIE_NAME = 'csrftoken'
 CSRF_HEADER_NAME = 'HTTP_X_CSRFTOKEN'
 
 # اگر از مرورگر قدیمی استفاده می‌کنید
-CSRF_USE_SESSIONS = False
\ No newline at end of file
+CSRF_USE_SESSIONS = False
+
+# ==================== VOTE BUFFER ====================
+# با True رأی‌ها در حافظه و ژورنال ثبت و دسته‌ای نوشته می‌شوند (reviews/vote_buffer.py)
+# فقط برای اجرا با یک پروسس؛ پیش از خاموش کردن سرور: python manage.py flush_votes
+VOTE_BUFFER_ENABLED = False
+VOTE_BUFFER_JOURNAL = BASE_DIR / 'vote_journal.jsonl'
+VOTE_BUFFER_FLUSH_INTERVAL = 5  # ثانیه
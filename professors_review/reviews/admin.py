@@ -1,14 +1,40 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
-from .models import Professor, Review, Question, Answer, UserDailyLimit
+from .models import Department, Professor, Review, Question, Answer, UserDailyLimit
+from .caching import bump_professor_content
+from .search import department_facets, schedule_reindex
 from django.contrib import messages
 
+class DepartmentFacetFilter(admin.SimpleListFilter):
+    """فیلتر دپارتمان از روی فاست‌های کش‌شده به جای DISTINCT روی کل جدول"""
+    title = _('دانشکده/دپارتمان')
+    parameter_name = 'department'
+
+    def lookups(self, request, model_admin):
+        return [
+            (str(facet['id']), f"{facet['department']} ({facet['count']})")
+            for facet in department_facets()
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value() and self.value().isdigit():
+            return queryset.filter(canonical_department_id=self.value())
+        return queryset
+
+
+@admin.register(Department)
+class DepartmentAdmin(admin.ModelAdmin):
+    list_display = ('name', 'key', 'professor_count', 'review_count', 'average_rating')
+    search_fields = ('name', 'key')
+    readonly_fields = ('key', 'professor_count', 'review_count', 'rating_sum', 'rating_average')
+
+
 @admin.register(Professor)
 class ProfessorAdmin(admin.ModelAdmin):
     list_display = ('name', 'department', 'image_preview', 'bio_preview', 'rating_preview')
     search_fields = ('name', 'department', 'bio')
-    list_filter = ('department',)
+    list_filter = (DepartmentFacetFilter,)
     readonly_fields = ('image_display', 'rating_display')
     
     fieldsets = (
@@ -88,7 +114,7 @@ class ProfessorAdmin(admin.ModelAdmin):
                 '<div style="font-size:24px;color:#FF9800;margin:10px 0;">{} <span style="font-size:18px;color:#666;">({:.1f} از 5)</span></div>'
                 '<div style="color:#666;font-size:14px;">بر اساس {} نظر دانشجویان</div>'
                 '</div>',
-                stars, rating, obj.reviews.filter(is_approved=True).count()
+                stars, rating, obj.review_count
             )
         return "<div style='color:#888;padding:10px;'>⭐ هنوز امتیازی ثبت نشده است</div>"
     
@@ -142,13 +168,22 @@ class ReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews', 'reject_reviews', 'fix_review_counts']
     
     def approve_reviews(self, request, queryset):
+        # update() سیگنال post_save را اجرا نمی‌کند، پس آمار استاد را دستی به‌روز می‌کنیم
+        professor_ids = set(queryset.values_list('professor_id', flat=True))
         count = queryset.update(is_approved=True)
+        Professor.refresh_rating_stats(professor_ids)
+        schedule_reindex(professor_ids)
+        bump_professor_content(professor_ids)
         self.message_user(request, f'✅ {count} نظر تأیید شد.')
     
     approve_reviews.short_description = "تأیید نظرات انتخاب‌شده"
     
     def reject_reviews(self, request, queryset):
+        professor_ids = set(queryset.values_list('professor_id', flat=True))
         count = queryset.update(is_approved=False)
+        Professor.refresh_rating_stats(professor_ids)
+        schedule_reindex(professor_ids)
+        bump_professor_content(professor_ids)
         self.message_user(request, f'❌ {count} نظر رد شد.')
     
     reject_reviews.short_description = "رد نظرات انتخاب‌شده"
@@ -219,13 +254,20 @@ class QuestionAdmin(admin.ModelAdmin):
     actions = ['approve_questions', 'reject_questions', 'fix_question_counts']
     
     def approve_questions(self, request, queryset):
+        # update() سیگنال‌ها را اجرا نمی‌کند، پس ایندکس جستجو را دستی به‌روز می‌کنیم
+        professor_ids = set(queryset.values_list('professor_id', flat=True))
         count = queryset.update(is_approved=True)
+        schedule_reindex(professor_ids)
+        bump_professor_content(professor_ids)
         self.message_user(request, f'✅ {count} پرسش تأیید شد.')
     
     approve_questions.short_description = "تأیید پرسش‌های انتخاب‌شده"
     
     def reject_questions(self, request, queryset):
+        professor_ids = set(queryset.values_list('professor_id', flat=True))
         count = queryset.update(is_approved=False)
+        schedule_reindex(professor_ids)
+        bump_professor_content(professor_ids)
         self.message_user(request, f'❌ {count} پرسش رد شد.')
     
     reject_questions.short_description = "رد پرسش‌های انتخاب‌شده"
@@ -305,13 +347,18 @@ class AnswerAdmin(admin.ModelAdmin):
     actions = ['approve_answers', 'reject_answers']
     
     def approve_answers(self, request, queryset):
+        # update() سیگنال‌ها را اجرا نمی‌کند، پس کش صفحه استاد را دستی باطل می‌کنیم
+        professor_ids = set(queryset.values_list('question__professor_id', flat=True))
         count = queryset.update(is_approved=True)
+        bump_professor_content(professor_ids)
         self.message_user(request, f'✅ {count} پاسخ تأیید شد.')
     
     approve_answers.short_description = "تأیید پاسخ‌های انتخاب‌شده"
     
     def reject_answers(self, request, queryset):
+        professor_ids = set(queryset.values_list('question__professor_id', flat=True))
         count = queryset.update(is_approved=False)
+        bump_professor_content(professor_ids)
         self.message_user(request, f'❌ {count} پاسخ رد شد.')
     
     reject_answers.short_description = "رد پاسخ‌های انتخاب‌شده"
@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ReviewsConfig(AppConfig):
     name = 'reviews'
+
+    def ready(self):
+        # ثبت هدف‌های رأی و سیگنال پاک کردن رأی‌های هدف حذف‌شده
+        from . import voting  # noqa: F401
+        from .search import reset_fts_available
+
+        # migrate ممکن است جدول FTS را ساخته یا حذف کرده باشد
+        post_migrate.connect(reset_fts_available, sender=self)
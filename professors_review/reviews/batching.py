@@ -0,0 +1,78 @@
+"""
+کارهای دسته‌ای پس از commit تراکنش
+
+سیگنال‌های post_save/post_delete در یک تراکنش (مثلاً حذف آبشاری یک استاد یا
+عملیات گروهی ادمین) صدها بار اجرا می‌شوند. به جای کار جداگانه برای هر ردیف،
+هر زیرکلاس OnCommitBatch تغییرات را در batch تراکنش جاری جمع می‌کند و یک بار
+پس از commit اعمال می‌کند (apply). بیرون از تراکنش batch بلافاصله اعمال می‌شود.
+"""
+import threading
+import weakref
+from abc import ABC, abstractmethod
+
+from django.db import transaction
+
+
+class _FlushCallback:
+    """callback ثبت‌شده در on_commit برای یک batch"""
+
+    def __init__(self, batch):
+        self.batch = batch
+
+    def __call__(self):
+        # batchی که پیش‌تر مستقیم flush شده دوباره اعمال نمی‌شود
+        if self.batch._callback is not None and self.batch._callback() is self:
+            self.batch.flush()
+
+
+class OnCommitBatch(ABC):
+    """
+    پایه batchهای پس از commit. هر زیرکلاس batch جاری جداگانه‌ای در هر نخ دارد.
+    استفاده: batch = Subclass.current()؛ افزودن تغییرات؛ batch.schedule()
+    """
+
+    # weakref به callback در صف on_commit؛ None یعنی flush شده یا هرگز زمان‌بندی نشده
+    _callback = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._local = threading.local()
+
+    @classmethod
+    def current(cls):
+        """batch تراکنش جاری؛ خارج از تراکنش یک batch تازه که schedule آن را بلافاصله اعمال می‌کند"""
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            return cls()
+
+        batch = getattr(cls._local, 'batch', None)
+        if batch is None or not batch.is_pending():
+            batch = cls()
+            cls._local.batch = batch
+            callback = _FlushCallback(batch)
+            batch._callback = weakref.ref(callback)
+            transaction.on_commit(callback)
+        return batch
+
+    def is_pending(self):
+        """
+        آیا flush هنوز پس از commit اجرا خواهد شد؟ Django برای rollback hook ندارد،
+        ولی callback تراکنش یا savepoint برگشت‌خورده را دور می‌اندازد؛ batch فقط
+        weakref به آن نگه می‌دارد، پس با rollback این weakref خالی می‌شود.
+        """
+        return self._callback is not None and self._callback() is not None
+
+    def schedule(self):
+        """خارج از تراکنش: اعمال بلافاصله؛ داخل تراکنش flush پس از commit اجرا می‌شود"""
+        if not transaction.get_connection().in_atomic_block:
+            self.flush()
+
+    def flush(self):
+        self._callback = None
+        if getattr(self._local, 'batch', None) is self:
+            self._local.batch = None
+        self.apply()
+
+    @abstractmethod
+    def apply(self):
+        """اعمال تغییرات جمع‌شده"""
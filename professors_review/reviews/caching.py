@@ -0,0 +1,55 @@
+"""
+کش قطعه‌های عمومی صفحه استاد و اعتبارسنج‌های HTTP
+
+هر استاد یک نسخه محتوا (Professor.content_version) و زمان آخرین تغییر
+(Professor.content_changed_at) دارد. با هر تغییر محتوای عمومی استاد (نظر،
+پرسش، پاسخ، رأی یا تأیید مدیر) هر دو به‌روز می‌شوند. قطعه‌هایی از صفحه استاد
+که برای همه کاربران یکسان است (بیوگرافی و خلاصه امتیاز، صفحه‌های نظرات و
+پرسش و پاسخ) با همین نسخه کلید می‌خورند و ETag/Last-Modified صفحه‌ها هم از
+آن ساخته می‌شوند. تغییر نسخه پس از commit تراکنش انجام می‌شود تا درخواست
+همزمان داده قدیمی را زیر نسخه جدید کش نکند.
+"""
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .batching import OnCommitBatch
+from .models import Professor
+
+# قطعه‌ها با نسخه کلید می‌خورند؛ این زمان فقط برای پاک شدن نسخه‌های قدیمی است
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+def cached_fragment(professor, name, build):
+    """
+    مقدار قطعه name استاد از کش؛ در صورت نبود با build() ساخته و کش می‌شود.
+    خروجی build باید قابل pickle باشد (رشته HTML یا dict ساده).
+    """
+    key = f'reviews:professor:{professor.pk}:{professor.content_version}:{name}'
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, FRAGMENT_TIMEOUT)
+    return value
+
+
+class _PendingBump(OnCommitBatch):
+    """اساتیدی که در تراکنش جاری تغییر کرده‌اند؛ نسخه‌شان یک بار پس از commit عوض می‌شود"""
+
+    def __init__(self):
+        self.professor_ids = set()
+
+    def apply(self):
+        Professor.objects.filter(pk__in=self.professor_ids).update(
+            content_version=F('content_version') + 1,
+            content_changed_at=timezone.now()
+        )
+
+
+def bump_professor_content(professor_ids):
+    """افزایش نسخه محتوای اساتید داده شده پس از commit تراکنش جاری"""
+    professor_ids = {pk for pk in professor_ids if pk is not None}
+    if not professor_ids:
+        return
+    batch = _PendingBump.current()
+    batch.professor_ids.update(professor_ids)
+    batch.schedule()
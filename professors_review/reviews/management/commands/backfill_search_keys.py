@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from reviews.models import Professor
+from reviews.search import rebuild_index
+
+class Command(BaseCommand):
+    help = 'محاسبه مجدد کلیدهای جستجوی اساتید (یکسان‌سازی شده و آوایی لاتین) و بازسازی ایندکس جستجو'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='تعداد رکورد در هر bulk_update (پیش‌فرض ۵۰۰)')
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        self.stdout.write(self.style.WARNING('در حال محاسبه کلیدهای جستجو...'))
+
+        changed = []
+        professors = Professor.objects.only('id', 'name', 'department', *Professor.SEARCH_KEY_FIELDS)
+        for professor in professors.iterator(chunk_size=batch_size):
+            if professor.refresh_search_keys():
+                changed.append(professor)
+        Professor.objects.bulk_update(changed, Professor.SEARCH_KEY_FIELDS, batch_size=batch_size)
+        self.stdout.write(f'{len(changed)} استاد به‌روز شد.')
+
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS('✓ کلیدهای جستجو و ایندکس تمام‌متن بازسازی شد.'))
@@ -1,13 +1,48 @@
-from django.core.management.base import BaseCommand
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
 from reviews.models import fix_current_daily_limits
 
 class Command(BaseCommand):
     help = 'رفع مشکل محدودیت‌های روزانه کاربران با تطبیق شمارنده‌ها با داده‌های واقعی'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=datetime.date.fromisoformat,
+                            help='فقط روزهای از این تاریخ به بعد، به وقت سایت (YYYY-MM-DD)')
+        parser.add_argument('--user', help='فقط برای این نام کاربری')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='فقط نمایش اختلاف‌ها بدون ذخیره')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='تعداد رکورد در هر bulk_update (پیش‌فرض ۵۰۰)')
+
     def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"کاربر {options['user']} یافت نشد.")
+        if options['batch_size'] < 1:
+            raise CommandError('batch-size باید بزرگ‌تر از صفر باشد.')
+
         self.stdout.write(self.style.WARNING('در حال رفع مشکل محدودیت‌های روزانه...'))
         
-        fix_current_daily_limits()
+        checked, changed = fix_current_daily_limits(
+            since=options['since'],
+            user=user,
+            dry_run=options['dry_run'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
         
-        self.stdout.write(self.style.SUCCESS('✓ رفع مشکل محدودیت‌های روزانه با موفقیت انجام شد.'))
-        self.stdout.write('از این به بعد وقتی نظر یا پرسشی حذف می‌شود، شمارنده به طور خودکار کاهش می‌یابد.')
\ No newline at end of file
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'اجرای آزمایشی: {changed} از {checked} رکورد نیاز به اصلاح دارد (چیزی ذخیره نشد).'
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ رفع مشکل محدودیت‌های روزانه با موفقیت انجام شد ({changed} از {checked} رکورد اصلاح شد).'
+        ))
+        self.stdout.write('از این به بعد وقتی نظر یا پرسشی حذف می‌شود، شمارنده به طور خودکار کاهش می‌یابد.')
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from reviews.vote_buffer import VoteBuffer
+
+class Command(BaseCommand):
+    help = 'نوشتن رأی‌های مانده در ژورنال بافر رأی در دیتابیس (پس از توقف سرور)'
+
+    def handle(self, *args, **options):
+        journal_path = getattr(settings, 'VOTE_BUFFER_JOURNAL', None)
+        if not journal_path:
+            self.stdout.write(self.style.WARNING('VOTE_BUFFER_JOURNAL تنظیم نشده است.'))
+            return
+
+        flushed = VoteBuffer(journal_path).flush()
+        self.stdout.write(self.style.SUCCESS(f'✓ {flushed} رأی در دیتابیس نوشته شد.'))
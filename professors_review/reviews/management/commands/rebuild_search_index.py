@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from reviews.models import Professor
+from reviews.search import fts_available, rebuild_index
+
+class Command(BaseCommand):
+    help = 'بازسازی کامل ایندکس جستجوی تمام‌متن (FTS5) اساتید'
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            self.stdout.write(self.style.WARNING('جدول FTS5 روی این دیتابیس وجود ندارد؛ جستجو از icontains استفاده می‌کند.'))
+            return
+
+        self.stdout.write(self.style.WARNING('در حال بازسازی ایندکس جستجو...'))
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'✓ ایندکس {Professor.objects.count()} استاد بازسازی شد.'))
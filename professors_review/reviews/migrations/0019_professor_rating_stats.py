@@ -0,0 +1,74 @@
+# Generated by Django 6.0.9 on 2026-10-17 02:37
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_stats(apps, schema_editor):
+    Professor = apps.get_model('reviews', 'Professor')
+    Review = apps.get_model('reviews', 'Review')
+
+    rows = (
+        Review.objects
+        .filter(is_approved=True)
+        .order_by()
+        .values('professor_id', 'rating')
+        .annotate(total=Count('id'))
+    )
+    stats = {}
+    for row in rows:
+        professor_stats = stats.setdefault(row['professor_id'], {'review_count': 0, 'rating_sum': 0})
+        professor_stats['review_count'] += row['total']
+        professor_stats['rating_sum'] += row['rating'] * row['total']
+        if 1 <= row['rating'] <= 5:
+            key = f"rating_{row['rating']}_count"
+            professor_stats[key] = professor_stats.get(key, 0) + row['total']
+
+    for professor_id, values in stats.items():
+        Professor.objects.filter(pk=professor_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0018_professorevaluation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='professor',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='تعداد امتیاز ۱'),
+        ),
+        migrations.AddField(
+            model_name='professor',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='تعداد امتیاز ۲'),
+        ),
+        migrations.AddField(
+            model_name='professor',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='تعداد امتیاز ۳'),
+        ),
+        migrations.AddField(
+            model_name='professor',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='تعداد امتیاز ۴'),
+        ),
+        migrations.AddField(
+            model_name='professor',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='تعداد امتیاز ۵'),
+        ),
+        migrations.AddField(
+            model_name='professor',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='مجموع امتیازها'),
+        ),
+        migrations.AddField(
+            model_name='professor',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='تعداد نظرات تأیید شده'),
+        ),
+        migrations.RunPython(backfill_rating_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.9 on 2026-10-17 02:38
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_vote_counters(apps, schema_editor):
+    for model_name in ('Review', 'Answer'):
+        model = apps.get_model('reviews', model_name)
+        rows = (
+            model.objects
+            .annotate(
+                likes=Count('votes', filter=Q(votes__value=1)),
+                dislikes=Count('votes', filter=Q(votes__value=-1)),
+            )
+            .filter(Q(likes__gt=0) | Q(dislikes__gt=0))
+            .values_list('pk', 'likes', 'dislikes')
+        )
+        for pk, likes, dislikes in rows:
+            model.objects.filter(pk=pk).update(likes_count=likes, dislikes_count=dislikes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0019_professor_rating_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='dislikes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='تعداد مخالف'),
+        ),
+        migrations.AddField(
+            model_name='answer',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='تعداد موافق'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='dislikes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='تعداد مخالف'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='تعداد موافق'),
+        ),
+        migrations.RunPython(backfill_vote_counters, migrations.RunPython.noop),
+    ]
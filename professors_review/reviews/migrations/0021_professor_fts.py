@@ -0,0 +1,52 @@
+from django.db import migrations
+
+
+FTS_TABLE = 'reviews_professor_fts'
+
+
+def create_fts_table(apps, schema_editor):
+    # FTS5 فقط روی SQLite؛ روی دیتابیس‌های دیگر جستجو به icontains برمی‌گردد
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "name, department, bio, content, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+
+    Professor = apps.get_model('reviews', 'Professor')
+    Review = apps.get_model('reviews', 'Review')
+    Question = apps.get_model('reviews', 'Question')
+
+    texts = {}
+    for model in (Review, Question):
+        for professor_id, text in model.objects.filter(is_approved=True).values_list('professor_id', 'text'):
+            texts.setdefault(professor_id, []).append(text)
+
+    rows = [
+        (pk, name, department, bio, '\n'.join(texts.get(pk, [])))
+        for pk, name, department, bio in Professor.objects.values_list('pk', 'name', 'department', 'bio')
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, department, bio, content) VALUES (%s, %s, %s, %s, %s)",
+            rows
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0020_vote_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 6.0.9 on 2026-10-17 02:44
+
+import re
+
+from django.db import migrations, models
+
+
+# نسخه ثابت reviews.normalization.normalize_text در زمان این migration؛ تغییرهای
+# بعدی آن ماژول رفتار این migration را روی دیتابیس تازه عوض نمی‌کند
+_CHARACTER_MAP = {
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    '\u200c': '', '\u200d': '', '\u200e': '', '\u200f': '', '\ufeff': '',
+    'ـ': '',
+}
+_CHARACTER_MAP.update({persian: str(digit) for digit, persian in enumerate('۰۱۲۳۴۵۶۷۸۹')})
+_CHARACTER_MAP.update({arabic: str(digit) for digit, arabic in enumerate('٠١٢٣٤٥٦٧٨٩')})
+_CHARACTER_MAP.update({chr(code): '' for code in range(0x064B, 0x0660)})
+_CHARACTER_MAP['ٰ'] = ''
+
+_TRANSLATION = str.maketrans(_CHARACTER_MAP)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    if not text:
+        return ''
+    return _WHITESPACE_RE.sub(' ', text.translate(_TRANSLATION)).strip().casefold()
+
+
+def backfill_search_keys(apps, schema_editor):
+    Professor = apps.get_model('reviews', 'Professor')
+    Review = apps.get_model('reviews', 'Review')
+    Question = apps.get_model('reviews', 'Question')
+
+    professors = list(Professor.objects.only('id', 'name', 'department', 'bio'))
+    for professor in professors:
+        professor.search_name = normalize_text(professor.name)
+        professor.search_department = normalize_text(professor.department)
+    Professor.objects.bulk_update(professors, ['search_name', 'search_department'], batch_size=500)
+
+    # ایندکس FTS ساخته‌شده در 0021 با متن یکسان‌سازی شده بازسازی می‌شود
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    texts = {}
+    for model in (Review, Question):
+        for professor_id, text in model.objects.filter(is_approved=True).values_list('professor_id', 'text'):
+            texts.setdefault(professor_id, []).append(normalize_text(text))
+    rows = [
+        (p.pk, p.search_name, p.search_department, normalize_text(p.bio), '\n'.join(texts.get(p.pk, [])))
+        for p in professors
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DELETE FROM reviews_professor_fts")
+        cursor.executemany(
+            "INSERT INTO reviews_professor_fts (rowid, name, department, bio, content) VALUES (%s, %s, %s, %s, %s)",
+            rows
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0021_professor_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='professor',
+            name='search_department',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='professor',
+            name='search_name',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.RunPython(backfill_search_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,144 @@
+# Generated by Django 6.0.9 on 2026-10-17 02:49
+
+import re
+
+from django.db import migrations, models
+
+
+# نسخه ثابت reviews.normalization.transliteration_key (و normalize_text که به آن
+# وابسته است) در زمان این migration؛ تغییرهای بعدی آن ماژول رفتار این migration
+# را روی دیتابیس تازه عوض نمی‌کند
+_CHARACTER_MAP = {
+    # حروف عربی → فارسی
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    # نیم‌فاصله و کاراکترهای نامرئی مشابه حذف می‌شوند
+    '\u200c': '', '\u200d': '', '\u200e': '', '\u200f': '', '\ufeff': '',
+    # کشیده
+    'ـ': '',
+}
+# ارقام فارسی و عربی → لاتین
+_CHARACTER_MAP.update({persian: str(digit) for digit, persian in enumerate('۰۱۲۳۴۵۶۷۸۹')})
+_CHARACTER_MAP.update({arabic: str(digit) for digit, arabic in enumerate('٠١٢٣٤٥٦٧٨٩')})
+# اعراب (فتحه، کسره، ضمه، تنوین، تشدید، سکون و ...)
+_CHARACTER_MAP.update({chr(code): '' for code in range(0x064B, 0x0660)})
+_CHARACTER_MAP['ٰ'] = ''
+
+_TRANSLATION = str.maketrans(_CHARACTER_MAP)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """یکسان‌سازی حروف، ارقام، اعراب، نیم‌فاصله و فاصله‌ها؛ خروجی با حروف کوچک"""
+    if not text:
+        return ''
+    return _WHITESPACE_RE.sub(' ', text.translate(_TRANSLATION)).strip().casefold()
+
+
+# =========================
+# کلید آوایی لاتین (فینگلیش)
+# =========================
+# مصوت‌های کوتاه در فارسی نوشته نمی‌شوند و ا/و/ی نقش مصوت هم دارند؛ پس کلید
+# فقط از صامت‌ها ساخته می‌شود و حروف هم‌صدا (س/ص/ث، ز/ذ/ض/ظ و ...) یکی می‌شوند.
+_PERSIAN_CONSONANTS = {
+    'ب': 'b', 'پ': 'p', 'ت': 't', 'ط': 't', 'ث': 's', 'س': 's', 'ص': 's',
+    'ج': 'j', 'چ': 'ch', 'ح': 'h', 'ه': 'h', 'خ': 'kh', 'د': 'd',
+    'ذ': 'z', 'ز': 'z', 'ژ': 'z', 'ض': 'z', 'ظ': 'z', 'ر': 'r', 'ش': 'sh',
+    'غ': 'q', 'ق': 'q', 'ف': 'f', 'ک': 'k', 'گ': 'g', 'ل': 'l', 'م': 'm', 'ن': 'n',
+}
+_LATIN_DIGRAPHS = (('gh', 'q'), ('ph', 'f'), ('zh', 'z'), ('ck', 'k'), ('ou', 'u'), ('ee', 'i'), ('oo', 'u'))
+_LATIN_LETTERS = {'c': 'k', 'x': 'ks', 'w': 'v'}
+_LATIN_VOWELS = frozenset('aeiou')
+_LATIN_SILENT_AFTER_FIRST = frozenset('vy')
+_PERSIAN_LETTER_RE = re.compile(r'[\u0600-\u06FF]')
+_LATIN_LETTER_RE = re.compile(r'[a-z]')
+_DUPLICATE_RE = re.compile(r'(.)\1+')
+_WORD_RE = re.compile(r'\w+')
+
+# عنوان‌هایی که جزو نام نیستند و در کلید نمی‌آیند
+TITLE_WORDS = frozenset({'دکتر', 'استاد', 'مهندس', 'پروفسور', 'dr', 'prof', 'doctor', 'ostad', 'mohandes'})
+
+
+def is_latin(text):
+    """آیا متن (یکسان‌سازی شده) حروف لاتین دارد و هیچ حرف فارسی ندارد؟"""
+    return bool(_LATIN_LETTER_RE.search(text)) and not _PERSIAN_LETTER_RE.search(text)
+
+
+def _persian_word_key(word):
+    letters = []
+    for position, char in enumerate(word):
+        if position == 0 and char == 'و':
+            letters.append('v')
+        elif position == 0 and char == 'ی':
+            letters.append('y')
+        elif char == 'ه' and position == len(word) - 1 and position > 0:
+            # «ه» پایانی (زاده، فقیه) معمولاً مصوت است و در فینگلیش گاهی نوشته نمی‌شود
+            continue
+        else:
+            # ا/ع/ء و و/ی میانی (مصوت) در نگاشت نیستند و کنار گذاشته می‌شوند
+            letters.append(_PERSIAN_CONSONANTS.get(char, ''))
+    return ''.join(letters)
+
+
+def _latin_word_key(word):
+    for digraph, replacement in _LATIN_DIGRAPHS:
+        word = word.replace(digraph, replacement)
+    # «ch» پیش از جایگزینی c→k حفظ می‌شود
+    word = word.replace('ch', '\0')
+    if len(word) > 1 and word.endswith('h') and word[-2] in _LATIN_VOWELS:
+        word = word[:-1]
+    letters = []
+    for position, char in enumerate(word):
+        if char == '\0':
+            letters.append('ch')
+        elif char in _LATIN_VOWELS or (position > 0 and char in _LATIN_SILENT_AFTER_FIRST):
+            continue
+        elif char.isascii() and char.isalpha():
+            letters.append(_LATIN_LETTERS.get(char, char))
+    return ''.join(letters)
+
+
+def transliteration_key(text, surname_first=True):
+    """
+    کلید آوایی لاتین متن (فارسی یا فینگلیش).
+    با surname_first آخرین کلمه (معمولاً نام خانوادگی) به ابتدای کلید می‌آید تا
+    جستجوی پیشوندی روی ستون ایندکس‌شده با نام خانوادگی هم کار کند.
+    """
+    words = [word for word in _WORD_RE.findall(normalize_text(text)) if word not in TITLE_WORDS]
+    keys = []
+    for word in words:
+        key = _latin_word_key(word) if is_latin(word) else _persian_word_key(word)
+        key = _DUPLICATE_RE.sub(r'\1', key)
+        if key:
+            keys.append(key)
+    if surname_first and len(keys) > 1:
+        keys = keys[-1:] + keys[:-1]
+    return ' '.join(keys)
+
+
+
+def backfill_search_latin(apps, schema_editor):
+    Professor = apps.get_model('reviews', 'Professor')
+    professors = list(Professor.objects.only('id', 'name'))
+    for professor in professors:
+        professor.search_latin = transliteration_key(professor.name)
+    Professor.objects.bulk_update(professors, ['search_latin'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0022_professor_search_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='professor',
+            name='search_latin',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.RunPython(backfill_search_latin, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.9 on 2026-10-17 02:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0023_professor_search_latin'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['professor', '-created_at', '-id'], name='review_approved_page_idx'),
+        ),
+    ]
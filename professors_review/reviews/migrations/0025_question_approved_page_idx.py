@@ -0,0 +1,19 @@
+# Generated by Django 6.0.9 on 2026-10-17 02:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0024_review_approved_page_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['professor', '-created_at', '-id'], name='question_approved_page_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0.9 on 2026-10-17 02:53
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def backfill_sort_columns(apps, schema_editor):
+    Professor = apps.get_model('reviews', 'Professor')
+    Review = apps.get_model('reviews', 'Review')
+
+    rows = (
+        Review.objects
+        .filter(is_approved=True)
+        .order_by()
+        .values('professor_id')
+        .annotate(total=Count('id'), rating_total=Sum('rating'), latest=Max('created_at'))
+    )
+    for row in rows:
+        Professor.objects.filter(pk=row['professor_id']).update(
+            rating_average=row['rating_total'] / row['total'],
+            last_review_at=row['latest']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0025_question_approved_page_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='professor',
+            name='last_review_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='تاریخ آخرین نظر'),
+        ),
+        migrations.AddField(
+            model_name='professor',
+            name='rating_average',
+            field=models.FloatField(default=0, editable=False, verbose_name='میانگین امتیاز'),
+        ),
+        migrations.AddIndex(
+            model_name='professor',
+            index=models.Index(fields=['name', 'id'], name='professor_name_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='professor',
+            index=models.Index(fields=['-rating_average', 'id'], name='professor_rating_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='professor',
+            index=models.Index(fields=['-review_count', 'id'], name='professor_reviews_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='professor',
+            index=models.Index(fields=['-last_review_at', 'id'], name='professor_recent_sort_idx'),
+        ),
+        migrations.RunPython(backfill_sort_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,153 @@
+# Generated by Django 6.0.9 on 2026-10-17 02:56
+
+import django.db.models.deletion
+import re
+from collections import Counter
+
+from django.db import migrations, models
+
+
+# نسخه ثابت reviews.normalization.department_key (و normalize_text که به آن وابسته
+# است) در زمان این migration؛ تغییرهای بعدی آن ماژول خوشه‌بندی این migration را
+# روی دیتابیس تازه عوض نمی‌کند
+_CHARACTER_MAP = {
+    # حروف عربی → فارسی
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    # نیم‌فاصله و کاراکترهای نامرئی مشابه حذف می‌شوند
+    '\u200c': '', '\u200d': '', '\u200e': '', '\u200f': '', '\ufeff': '',
+    # کشیده
+    'ـ': '',
+}
+# ارقام فارسی و عربی → لاتین
+_CHARACTER_MAP.update({persian: str(digit) for digit, persian in enumerate('۰۱۲۳۴۵۶۷۸۹')})
+_CHARACTER_MAP.update({arabic: str(digit) for digit, arabic in enumerate('٠١٢٣٤٥٦٧٨٩')})
+# اعراب (فتحه، کسره، ضمه، تنوین، تشدید، سکون و ...)
+_CHARACTER_MAP.update({chr(code): '' for code in range(0x064B, 0x0660)})
+_CHARACTER_MAP['ٰ'] = ''
+
+_TRANSLATION = str.maketrans(_CHARACTER_MAP)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """یکسان‌سازی حروف، ارقام، اعراب، نیم‌فاصله و فاصله‌ها؛ خروجی با حروف کوچک"""
+    if not text:
+        return ''
+    return _WHITESPACE_RE.sub(' ', text.translate(_TRANSLATION)).strip().casefold()
+
+
+_WORD_RE = re.compile(r'\w+')
+
+# پیشوندهای سازمانی که در نام دپارتمان‌ها اختیاری نوشته می‌شوند؛ «دانشکده فیزیک»
+# و «گروه آموزشی فیزیک» هر دو به کلید «فیزیک» می‌رسند. «مهندسی» جزو آن‌ها نیست،
+# چون «مهندسی شیمی» و «شیمی» (یا «مهندسی پزشکی» و «پزشکی») دپارتمان‌های جدا هستند.
+DEPARTMENT_NOISE_WORDS = frozenset({
+    'دانشکده', 'گروه', 'رشته', 'دپارتمان', 'اموزشی',
+    'department', 'faculty', 'school', 'of',
+})
+
+# کوتاه‌نوشت‌هایی که فقط یک دپارتمان را می‌رسانند: {کلید کوتاه: کلید کامل}
+DEPARTMENT_ALIASES = {
+    'کامپیوتر': 'مهندسی کامپیوتر',
+    'برق': 'مهندسی برق',
+    'عمران': 'مهندسی عمران',
+    'مکانیک': 'مهندسی مکانیک',
+}
+
+
+def department_key(text):
+    """کلید یکتای دپارتمان برای خوشه‌بندی نام‌های مختلف یک دپارتمان"""
+    words = _WORD_RE.findall(normalize_text(text))
+    key = ' '.join([word for word in words if word not in DEPARTMENT_NOISE_WORDS] or words)
+    return DEPARTMENT_ALIASES.get(key, key)
+
+
+def cluster_departments(apps, schema_editor):
+    """
+    خوشه‌بندی متن‌های آزاد Professor.department با department_key. نام هر
+    دپارتمان پرتکرارترین نوشتار خوشه است (در تساوی، کوتاه‌ترین).
+    """
+    Professor = apps.get_model('reviews', 'Professor')
+    Department = apps.get_model('reviews', 'Department')
+
+    professors = list(Professor.objects.only('id', 'department', 'review_count', 'rating_sum'))
+    spellings = {}
+    for professor in professors:
+        key = department_key(professor.department)
+        if key:
+            spellings.setdefault(key, Counter())[professor.department.strip()] += 1
+
+    departments = {}
+    for key, counter in spellings.items():
+        name = min(counter, key=lambda spelling: (-counter[spelling], len(spelling), spelling))
+        departments[key] = Department.objects.create(key=key, name=name)
+
+    for professor in professors:
+        department = departments.get(department_key(professor.department))
+        professor.canonical_department_id = department.pk if department else None
+        if department:
+            department.professor_count += 1
+            department.review_count += professor.review_count
+            department.rating_sum += professor.rating_sum
+    Professor.objects.bulk_update(professors, ['canonical_department'], batch_size=500)
+
+    for department in departments.values():
+        if department.review_count:
+            department.rating_average = department.rating_sum / department.review_count
+    Department.objects.bulk_update(
+        list(departments.values()),
+        ['professor_count', 'review_count', 'rating_sum', 'rating_average']
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0026_professor_sort_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Department',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='نام')),
+                ('key', models.CharField(editable=False, max_length=200, unique=True, verbose_name='کلید یکسان\u200cسازی شده')),
+                ('professor_count', models.PositiveIntegerField(default=0, editable=False, verbose_name='تعداد اساتید')),
+                ('review_count', models.PositiveIntegerField(default=0, editable=False, verbose_name='تعداد نظرات تأیید شده')),
+                ('rating_sum', models.PositiveIntegerField(default=0, editable=False, verbose_name='مجموع امتیازها')),
+                ('rating_average', models.FloatField(default=0, editable=False, verbose_name='میانگین امتیاز')),
+            ],
+            options={
+                'verbose_name': 'دپارتمان',
+                'verbose_name_plural': 'دپارتمان\u200cها',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='professor',
+            name='canonical_department',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='professors', to='reviews.department', verbose_name='دپارتمان یکسان\u200cسازی شده'),
+        ),
+        migrations.AddIndex(
+            model_name='professor',
+            index=models.Index(fields=['canonical_department', 'name', 'id'], name='professor_dept_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='professor',
+            index=models.Index(fields=['canonical_department', '-rating_average', 'id'], name='professor_dept_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='professor',
+            index=models.Index(fields=['canonical_department', '-review_count', 'id'], name='professor_dept_reviews_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='professor',
+            index=models.Index(fields=['canonical_department', '-last_review_at', 'id'], name='professor_dept_recent_idx'),
+        ),
+        migrations.RunPython(cluster_departments, migrations.RunPython.noop),
+    ]
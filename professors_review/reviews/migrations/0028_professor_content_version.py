@@ -0,0 +1,24 @@
+# Generated by Django 6.0.9 on 2026-10-17 03:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0027_department'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='professor',
+            name='content_changed_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False, verbose_name='زمان آخرین تغییر محتوا'),
+        ),
+        migrations.AddField(
+            model_name='professor',
+            name='content_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='نسخه محتوا'),
+        ),
+    ]
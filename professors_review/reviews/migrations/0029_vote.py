@@ -0,0 +1,80 @@
+# Generated by Django 6.0.9 on 2026-10-17 03:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+# (مدل رأی قدیمی، نام رابطه به هدف، target_type در جدول یکپارچه)
+OLD_VOTE_TABLES = (
+    ('ReviewVote', 'review', 'review'),
+    ('AnswerVote', 'answer', 'answer'),
+)
+
+
+def copy_votes_to_unified_table(apps, schema_editor):
+    Vote = apps.get_model('reviews', 'Vote')
+    for model_name, target_field, target_type in OLD_VOTE_TABLES:
+        rows = apps.get_model('reviews', model_name).objects.order_by('pk').values_list(
+            f'{target_field}_id', 'user_id', 'value'
+        )
+        batch = []
+        for target_id, user_id, value in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append(Vote(target_type=target_type, target_id=target_id, user_id=user_id, value=value))
+            if len(batch) >= BATCH_SIZE:
+                Vote.objects.bulk_create(batch)
+                batch = []
+        Vote.objects.bulk_create(batch)
+
+
+def copy_votes_to_old_tables(apps, schema_editor):
+    Vote = apps.get_model('reviews', 'Vote')
+    for model_name, target_field, target_type in OLD_VOTE_TABLES:
+        model = apps.get_model('reviews', model_name)
+        target_model = model._meta.get_field(target_field).related_model
+        # رأی‌های هدف‌های حذف‌شده‌ای که هنوز پاک نشده‌اند کلید خارجی معتبر ندارند
+        rows = Vote.objects.filter(
+            target_type=target_type,
+            target_id__in=target_model.objects.values('pk'),
+        ).order_by('pk').values_list('target_id', 'user_id', 'value')
+        batch = []
+        for target_id, user_id, value in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append(model(**{f'{target_field}_id': target_id}, user_id=user_id, value=value))
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_create(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0028_professor_content_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Vote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_type', models.CharField(max_length=32, verbose_name='نوع هدف')),
+                ('target_id', models.PositiveBigIntegerField(verbose_name='شناسه هدف')),
+                ('value', models.SmallIntegerField(choices=[(1, 'موافق'), (-1, 'مخالف')], verbose_name='رأی')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='کاربر')),
+            ],
+            options={
+                'verbose_name': 'رأی',
+                'verbose_name_plural': 'رأی‌ها',
+                'constraints': [models.UniqueConstraint(fields=('target_type', 'target_id', 'user'), name='vote_target_user_uniq')],
+            },
+        ),
+        migrations.RunPython(copy_votes_to_unified_table, copy_votes_to_old_tables),
+        migrations.DeleteModel(
+            name='AnswerVote',
+        ),
+        migrations.DeleteModel(
+            name='ReviewVote',
+        ),
+    ]
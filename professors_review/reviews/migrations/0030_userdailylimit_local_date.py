@@ -0,0 +1,19 @@
+# Generated by Django 6.0.9 on 2026-10-17 03:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0029_vote'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userdailylimit',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate, verbose_name='تاریخ'),
+        ),
+    ]
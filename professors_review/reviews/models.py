@@ -1,24 +1,118 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
-import datetime
-from django.db.models.signals import post_delete
+import logging
+from collections import defaultdict
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from .batching import OnCommitBatch
+from .normalization import department_key, normalize_text, transliteration_key
+
+logger = logging.getLogger(__name__)
+
 # =========================
 # ثابت‌های سیستم
 # =========================
 DAILY_REVIEW_LIMIT = 3  # تغییر از ۴ به ۳
 DAILY_QUESTION_LIMIT = 3  # تغییر از ۴ به ۳
 
+# =========================
+# Department
+# =========================
+class Department(models.Model):
+    """
+    دپارتمان یکسان‌سازی شده. نام‌های مختلف یک دپارتمان در Professor.department
+    (مثل «مهندسی کامپیوتر» و «کامپیوتر») با department_key به یک ردیف می‌رسند.
+    آمار تجمیعی اساتید روی همین ردیف ذخیره می‌شود.
+    """
+    name = models.CharField(max_length=200, verbose_name=_("نام"))
+    key = models.CharField(max_length=200, unique=True, editable=False, verbose_name=_("کلید یکسان‌سازی شده"))
+
+    professor_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("تعداد اساتید"))
+    review_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("تعداد نظرات تأیید شده"))
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("مجموع امتیازها"))
+    rating_average = models.FloatField(default=0, editable=False, verbose_name=_("میانگین امتیاز"))
+
+    STAT_FIELDS = ('professor_count', 'review_count', 'rating_sum', 'rating_average')
+
+    class Meta:
+        verbose_name = _("دپارتمان")
+        verbose_name_plural = _("دپارتمان‌ها")
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def average_rating(self):
+        if self.review_count:
+            return round(self.rating_sum / self.review_count, 1)
+        return None
+
+    @classmethod
+    def for_name(cls, name):
+        """دپارتمان متناظر با متن آزاد (در صورت نیاز ساخته می‌شود)؛ None برای متن خالی"""
+        key = department_key(name)
+        if not key:
+            return None
+        department, created = cls.objects.get_or_create(key=key, defaults={'name': name.strip()})
+        return department
+
+    @classmethod
+    def refresh_stats(cls, department_ids):
+        """بازمحاسبه آمار دپارتمان‌ها با یک کوئری گروه‌بندی شده روی آمار ذخیره‌شده اساتید"""
+        department_ids = {pk for pk in department_ids if pk is not None}
+        if not department_ids:
+            return
+
+        stats = {pk: dict.fromkeys(cls.STAT_FIELDS, 0) for pk in department_ids}
+        rows = (
+            Professor.objects
+            .filter(canonical_department_id__in=department_ids)
+            .order_by()
+            .values('canonical_department_id')
+            .annotate(
+                professors=models.Count('id'),
+                reviews=models.Sum('review_count'),
+                ratings=models.Sum('rating_sum')
+            )
+        )
+        for row in rows:
+            department_stats = stats[row['canonical_department_id']]
+            department_stats['professor_count'] = row['professors']
+            department_stats['review_count'] = row['reviews'] or 0
+            department_stats['rating_sum'] = row['ratings'] or 0
+            if department_stats['review_count']:
+                department_stats['rating_average'] = department_stats['rating_sum'] / department_stats['review_count']
+
+        cls.objects.bulk_update(
+            [cls(pk=pk, **values) for pk, values in stats.items()],
+            cls.STAT_FIELDS
+        )
+
+        from .search import invalidate_department_facets
+        transaction.on_commit(invalidate_department_facets)
+
+
 # =========================
 # Professor
 # =========================
 class Professor(models.Model):
     name = models.CharField(max_length=200, verbose_name=_("نام کامل"))
     department = models.CharField(max_length=200, blank=True, verbose_name=_("دانشکده/دپارتمان"))
+    # دپارتمان یکسان‌سازی شده متناظر با department؛ در save() تعیین می‌شود
+    canonical_department = models.ForeignKey(
+        Department,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='professors',
+        verbose_name=_("دپارتمان یکسان‌سازی شده")
+    )
     bio = models.TextField(blank=True, verbose_name=_("بیوگرافی"), 
                           help_text=_("توضیحاتی درباره سوابق تحصیلی، تخصص‌ها و افتخارات استاد"))
     image = models.ImageField(
@@ -28,22 +122,130 @@ class Professor(models.Model):
         verbose_name=_("عکس پروفایل"),
         help_text=_("عکس با ابعاد مناسب (ترجیحاً مربعی) حداکثر 2MB")
     )
+
+    # آمار ذخیره‌شده نظرات تأیید شده (برای جلوگیری از کوئری در صفحات لیست)
+    review_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("تعداد نظرات تأیید شده"))
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("مجموع امتیازها"))
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("تعداد امتیاز ۱"))
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("تعداد امتیاز ۲"))
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("تعداد امتیاز ۳"))
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("تعداد امتیاز ۴"))
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("تعداد امتیاز ۵"))
+    # ستون‌های ایندکس‌شده برای مرتب‌سازی لیست اساتید
+    rating_average = models.FloatField(default=0, editable=False, verbose_name=_("میانگین امتیاز"))
+    last_review_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name=_("تاریخ آخرین نظر"))
+
+    # نسخه و زمان آخرین تغییر محتوای عمومی صفحه استاد (نظر، پرسش، پاسخ، رأی، تأیید)
+    # برای کلید کش قطعه‌ها و ETag/Last-Modified؛ از طریق caching.bump_professor_content
+    content_version = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("نسخه محتوا"))
+    content_changed_at = models.DateTimeField(default=timezone.now, editable=False, db_index=True,
+                                              verbose_name=_("زمان آخرین تغییر محتوا"))
+
+    # کلیدهای جستجوی یکسان‌سازی شده (ی/ک عربی، نیم‌فاصله، ارقام، اعراب)
+    search_name = models.CharField(max_length=200, blank=True, editable=False, db_index=True)
+    search_department = models.CharField(max_length=200, blank=True, editable=False, db_index=True)
+    # اسکلت آوایی لاتین نام (نام خانوادگی اول) برای جستجوی فینگلیش با تطبیق پیشوندی
+    search_latin = models.CharField(max_length=200, blank=True, editable=False, db_index=True)
+
+    RATING_STAT_FIELDS = (
+        'review_count', 'rating_sum',
+        'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+        'rating_average', 'last_review_at',
+    )
+    SEARCH_KEY_FIELDS = ('search_name', 'search_department', 'search_latin')
     
     class Meta:
         verbose_name = _("استاد")
         verbose_name_plural = _("اساتید")
         ordering = ['name']
+        indexes = [
+            # هر حالت مرتب‌سازی صفحه اصلی یک ایندکس هم‌ترتیب دارد (id برای ترتیب یکتا)
+            models.Index(fields=['name', 'id'], name='professor_name_sort_idx'),
+            models.Index(fields=['-rating_average', 'id'], name='professor_rating_sort_idx'),
+            models.Index(fields=['-review_count', 'id'], name='professor_reviews_sort_idx'),
+            models.Index(fields=['-last_review_at', 'id'], name='professor_recent_sort_idx'),
+            # فیلتر دپارتمان در صفحه اصلی و پنل مدیریت، با همان ترتیب‌های بالا
+            models.Index(fields=['canonical_department', 'name', 'id'], name='professor_dept_name_idx'),
+            models.Index(fields=['canonical_department', '-rating_average', 'id'], name='professor_dept_rating_idx'),
+            models.Index(fields=['canonical_department', '-review_count', 'id'], name='professor_dept_reviews_idx'),
+            models.Index(fields=['canonical_department', '-last_review_at', 'id'], name='professor_dept_recent_idx'),
+        ]
     
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.refresh_search_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'name', 'department'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | set(self.SEARCH_KEY_FIELDS)
+
+        # دپارتمان قبلی برای به‌روزرسانی آمار آن در سیگنال post_save نگه داشته می‌شود
+        self._previous_department_id = self.canonical_department_id
+        if update_fields is None or 'department' in update_fields:
+            department = Department.for_name(self.department)
+            self.canonical_department_id = department.pk if department else None
+            if update_fields is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'canonical_department'}
+        super().save(*args, **kwargs)
+
+    def refresh_search_keys(self):
+        """محاسبه کلیدهای جستجو؛ خروجی True اگر تغییری داشتند"""
+        keys = (normalize_text(self.name), normalize_text(self.department), transliteration_key(self.name))
+        changed = (self.search_name, self.search_department, self.search_latin) != keys
+        self.search_name, self.search_department, self.search_latin = keys
+        return changed
+
     @property
     def average_rating(self):
-        approved_reviews = self.reviews.filter(is_approved=True)
-        if approved_reviews.exists():
-            return round(sum(r.rating for r in approved_reviews) / approved_reviews.count(), 1)
+        if self.review_count:
+            return round(self.rating_sum / self.review_count, 1)
         return None
 
+    @property
+    def rating_histogram(self):
+        """تعداد نظرات تأیید شده به تفکیک امتیاز ۱ تا ۵"""
+        return [getattr(self, f'rating_{i}_count') for i in range(1, 6)]
+
+    @classmethod
+    def refresh_rating_stats(cls, professor_ids):
+        """بازمحاسبه آمار امتیاز اساتید با یک کوئری گروه‌بندی شده و یک bulk_update"""
+        professor_ids = {pk for pk in professor_ids if pk is not None}
+        if not professor_ids:
+            return
+
+        stats = {pk: dict.fromkeys(cls.RATING_STAT_FIELDS, 0) for pk in professor_ids}
+        for professor_stats in stats.values():
+            professor_stats['last_review_at'] = None
+        rows = (
+            Review.objects
+            .filter(professor_id__in=professor_ids, is_approved=True)
+            .order_by()
+            .values('professor_id', 'rating')
+            .annotate(total=models.Count('id'), latest=models.Max('created_at'))
+        )
+        for row in rows:
+            professor_stats = stats[row['professor_id']]
+            professor_stats['review_count'] += row['total']
+            professor_stats['rating_sum'] += row['rating'] * row['total']
+            if 1 <= row['rating'] <= 5:
+                professor_stats[f"rating_{row['rating']}_count"] += row['total']
+            if professor_stats['last_review_at'] is None or row['latest'] > professor_stats['last_review_at']:
+                professor_stats['last_review_at'] = row['latest']
+        for professor_stats in stats.values():
+            if professor_stats['review_count']:
+                professor_stats['rating_average'] = professor_stats['rating_sum'] / professor_stats['review_count']
+
+        cls.objects.bulk_update(
+            [cls(pk=pk, **values) for pk, values in stats.items()],
+            cls.RATING_STAT_FIELDS
+        )
+
+        # آمار دپارتمان‌های این اساتید هم عوض شده است
+        Department.refresh_stats(
+            cls.objects.filter(pk__in=professor_ids).values_list('canonical_department_id', flat=True)
+        )
+
     def get_image_url(self):
         if self.image and hasattr(self.image, 'url'):
             return self.image.url
@@ -65,48 +267,27 @@ class Review(models.Model):
     rating = models.PositiveSmallIntegerField(verbose_name=_("امتیاز"))
     is_approved = models.BooleanField(default=False, verbose_name=_("تأیید شده"))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("تاریخ ایجاد"))
+    likes_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("تعداد موافق"))
+    dislikes_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("تعداد مخالف"))
 
     class Meta:
         verbose_name = _("نظر")
         verbose_name_plural = _("نظرات")
         ordering = ['-created_at']
+        indexes = [
+            # صفحه‌بندی keyset نظرات تأیید شده هر استاد روی (created_at, id).
+            # ایندکس جزئی است: SQLite شرط is_approved (که بدون «= 1» کامپایل می‌شود)
+            # را برابری ستون ایندکس حساب نمی‌کند و برای مرتب‌سازی B-tree موقت می‌سازد.
+            models.Index(
+                fields=['professor', '-created_at', '-id'],
+                condition=models.Q(is_approved=True),
+                name='review_approved_page_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.rating}"
 
-    def likes_count(self):
-        return self.votes.filter(value=1).count()
-
-    def dislikes_count(self):
-        return self.votes.filter(value=-1).count()
-
-
-# =========================
-# Review Vote
-# =========================
-class ReviewVote(models.Model):
-    VOTE_CHOICES = (
-        (1, 'موافق'),
-        (-1, 'مخالف'),
-    )
-
-    review = models.ForeignKey(
-        Review,
-        on_delete=models.CASCADE,
-        related_name='votes',
-        verbose_name=_("نظر")
-    )
-    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_("کاربر"))
-    value = models.SmallIntegerField(choices=VOTE_CHOICES, verbose_name=_("رأی"))
-
-    class Meta:
-        verbose_name = _("رأی به نظر")
-        verbose_name_plural = _("رأی‌ها به نظرات")
-        unique_together = ('review', 'user')
-    
-    def __str__(self):
-        return f"{self.user.username} رأی {self.value} به نظر {self.review.id}"
-
 
 # =========================
 # Question
@@ -127,6 +308,14 @@ class Question(models.Model):
         verbose_name = _("پرسش")
         verbose_name_plural = _("پرسش‌ها")
         ordering = ['-created_at']
+        indexes = [
+            # صفحه‌بندی keyset پرسش‌های تأیید شده هر استاد؛ جزئی به همان دلیل ایندکس نظرات
+            models.Index(
+                fields=['professor', '-created_at', '-id'],
+                condition=models.Q(is_approved=True),
+                name='question_approved_page_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.text[:30]}"
@@ -146,6 +335,8 @@ class Answer(models.Model):
     text = models.TextField(verbose_name=_("متن پاسخ"))
     is_approved = models.BooleanField(default=False, verbose_name=_("تأیید شده"))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("تاریخ ایجاد"))
+    likes_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("تعداد موافق"))
+    dislikes_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("تعداد مخالف"))
 
     class Meta:
         verbose_name = _("پاسخ")
@@ -155,38 +346,37 @@ class Answer(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.text[:30]}"
 
-    def likes_count(self):
-        return self.votes.filter(value=1).count()
-
-    def dislikes_count(self):
-        return self.votes.filter(value=-1).count()
-
 
 # =========================
-# Answer Vote
+# Vote
 # =========================
-class AnswerVote(models.Model):
+class Vote(models.Model):
+    """
+    رأی (موافق/مخالف) کاربر به یک هدف: نظر، پاسخ یا هر مدل دیگری که در
+    voting.VOTE_KINDS ثبت شود. target_type نام مدل هدف (_meta.model_name) است
+    و ایندکس یکتای (target_type, target_id, user) هم رأی کاربر را پیدا می‌کند و
+    هم upsert موتور رأی را ممکن می‌کند. target_id کلید خارجی نیست، پس رأی‌های
+    هدف حذف‌شده در DeleteCounterBatch پاک می‌شوند.
+    """
     VOTE_CHOICES = (
         (1, 'موافق'),
         (-1, 'مخالف'),
     )
 
-    answer = models.ForeignKey(
-        Answer,
-        on_delete=models.CASCADE,
-        related_name='votes',
-        verbose_name=_("پاسخ")
-    )
+    target_type = models.CharField(max_length=32, verbose_name=_("نوع هدف"))
+    target_id = models.PositiveBigIntegerField(verbose_name=_("شناسه هدف"))
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_("کاربر"))
     value = models.SmallIntegerField(choices=VOTE_CHOICES, verbose_name=_("رأی"))
 
     class Meta:
-        verbose_name = _("رأی به پاسخ")
-        verbose_name_plural = _("رأی‌ها به پاسخ‌ها")
-        unique_together = ('answer', 'user')
-    
+        verbose_name = _("رأی")
+        verbose_name_plural = _("رأی‌ها")
+        constraints = [
+            models.UniqueConstraint(fields=['target_type', 'target_id', 'user'], name='vote_target_user_uniq'),
+        ]
+
     def __str__(self):
-        return f"{self.user.username} رأی {self.value} به پاسخ {self.answer.id}"
+        return f"{self.user.username} رأی {self.value} به {self.target_type} {self.target_id}"
 
 
 # =========================
@@ -327,9 +517,13 @@ class ProfessorEvaluation(models.Model):
 # User Daily Limit
 # =========================
 class UserDailyLimit(models.Model):
-    """مدل برای ذخیره محدودیت روزانه کاربران"""
+    """
+    مدل برای ذخیره محدودیت روزانه کاربران.
+    روز همیشه timezone.localdate است (TIME_ZONE سایت، نه ساعت سرور)، همان روزی که
+    DeleteCounterBatch و fix_limits از created_at پست‌ها به دست می‌آورند.
+    """
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_("کاربر"))
-    date = models.DateField(default=datetime.date.today, verbose_name=_("تاریخ"))
+    date = models.DateField(default=timezone.localdate, verbose_name=_("تاریخ"))
     review_count = models.IntegerField(default=0, verbose_name=_("تعداد نظرات"))
     question_count = models.IntegerField(default=0, verbose_name=_("تعداد پرسش‌ها"))
     
@@ -351,125 +545,306 @@ class UserDailyLimit(models.Model):
         return self.question_count < DAILY_QUESTION_LIMIT
     
     @classmethod
-    def get_or_create_today(cls, user):
-        """دریافت یا ایجاد رکورد محدودیت برای کاربر امروز"""
-        today = datetime.date.today()
-        obj, created = cls.objects.get_or_create(
-            user=user,
-            date=today,
-            defaults={'review_count': 0, 'question_count': 0}
-        )
-        return obj
+    def get_today(cls, user):
+        """دریافت رکورد امروز کاربر بدون نوشتن در دیتابیس (نبود رکورد یعنی مصرف صفر)"""
+        today = timezone.localdate()
+        daily_limit = cls.objects.filter(user=user, date=today).first()
+        if daily_limit is None:
+            daily_limit = cls(user=user, date=today, review_count=0, question_count=0)
+        return daily_limit
     
-    def increment_review(self):
-        """افزایش شمارنده نظرات"""
-        if self.review_count < DAILY_REVIEW_LIMIT:
-            self.review_count += 1
-            self.save()
+    @classmethod
+    def _consume(cls, user, field, limit):
+        """
+        مصرف اتمیک سهمیه با UPDATE شرطی (field < limit).
+        اگر رکورد امروز وجود نداشته باشد با مقدار ۱ ساخته می‌شود.
+        خروجی True یعنی سهمیه مصرف شد.
+        """
+        today = timezone.localdate()
+        within_limit = cls.objects.filter(user=user, date=today, **{f'{field}__lt': limit})
+        if within_limit.update(**{field: models.F(field) + 1}):
             return True
-        return False
-    
-    def increment_question(self):
-        """افزایش شمارنده پرسش‌ها"""
-        if self.question_count < DAILY_QUESTION_LIMIT:
-            self.question_count += 1
-            self.save()
+        try:
+            with transaction.atomic():
+                cls.objects.create(user=user, date=today, **{field: 1})
             return True
-        return False
+        except IntegrityError:
+            # رکورد وجود دارد: یا سهمیه تمام شده یا درخواست همزمان آن را ساخته است
+            return within_limit.update(**{field: models.F(field) + 1}) > 0
     
-    def decrement_review(self):
-        """کاهش شمارنده نظرات (برای وقتی که نظر حذف می‌شود)"""
-        if self.review_count > 0:
-            self.review_count -= 1
-            self.save()
-            return True
-        return False
+    @classmethod
+    def consume_review(cls, user):
+        return cls._consume(user, 'review_count', DAILY_REVIEW_LIMIT)
     
-    def decrement_question(self):
-        """کاهش شمارنده پرسش‌ها (برای وقتی که پرسش حذف می‌شود)"""
-        if self.question_count > 0:
-            self.question_count -= 1
-            self.save()
-            return True
-        return False
+    @classmethod
+    def consume_question(cls, user):
+        return cls._consume(user, 'question_count', DAILY_QUESTION_LIMIT)
 
 
 # =========================
-# سیگنال‌ها برای کاهش شمارنده هنگام حذف
+# به‌روزرسانی گروهی شمارنده‌ها هنگام حذف
 # =========================
+class DeleteCounterBatch(OnCommitBatch):
+    """
+    تغییرات شمارنده‌ها را در طول یک تراکنش جمع می‌کند و در پایان آن
+    با یک UPDATE گروه‌بندی شده اعمال می‌کند.
+    حذف یک استاد یا حذف گروهی در ادمین صدها سیگنال post_delete می‌فرستد؛
+    به جای یک lookup و save برای هر ردیف، همه در یک بار اعمال می‌شوند.
+    """
+
+    # تعداد جفت (کاربر، تاریخ) در هر UPDATE، برای ماندن زیر محدودیت عمق عبارت SQLite
+    CHUNK_SIZE = 200
+
+    def __init__(self):
+        self.daily_limit_deltas = defaultdict(lambda: {'review_count': 0, 'question_count': 0})
+        self.professor_ids = set()
+        # {target_type: {target_id}} هدف‌های رأی حذف‌شده
+        self.vote_targets = defaultdict(set)
+        # {(target_type, target_id): [likes, dislikes]} رأی‌های حذف‌شده بیرون از موتور رأی
+        self.vote_deltas = defaultdict(lambda: [0, 0])
+
+    def add_deleted_post(self, instance, field):
+        day = timezone.localdate(instance.created_at)
+        self.daily_limit_deltas[(instance.user_id, day)][field] += 1
+
+    def add_deleted_vote(self, vote):
+        self.vote_deltas[(vote.target_type, vote.target_id)][0 if vote.value == 1 else 1] += 1
+
+    def apply(self):
+        deltas = list(self.daily_limit_deltas.items())
+        for offset in range(0, len(deltas), self.CHUNK_SIZE):
+            self._apply_daily_limit_deltas(deltas[offset:offset + self.CHUNK_SIZE])
+        if deltas:
+            logger.info("کاهش شمارنده‌های روزانه برای %d جفت (کاربر، تاریخ)", len(deltas))
+
+        if self.professor_ids:
+            Professor.refresh_rating_stats(self.professor_ids)
+
+        if self.vote_deltas:
+            from .voting import subtract_vote_counts
+            subtract_vote_counts(self.vote_deltas)
+
+        if self.vote_targets:
+            from .voting import VOTE_KINDS
+            for target_type, target_ids in self.vote_targets.items():
+                target_ids = sorted(target_ids)
+                for offset in range(0, len(target_ids), self.CHUNK_SIZE):
+                    # یک DELETE برای هر دسته، بدون post_delete برای تک‌تک رأی‌ها
+                    VOTE_KINDS[target_type].delete_target_votes(target_ids[offset:offset + self.CHUNK_SIZE])
+
+    @staticmethod
+    def _apply_daily_limit_deltas(deltas):
+        from django.db.models import Case, F, Q, Value, When
+        from django.db.models.functions import Greatest
+
+        condition = Q()
+        cases = {'review_count': [], 'question_count': []}
+        for (user_id, day), delta in deltas:
+            match = Q(user_id=user_id, date=day)
+            condition |= match
+            for field, amount in delta.items():
+                if amount:
+                    cases[field].append(When(match, then=Greatest(F(field) - amount, Value(0))))
+
+        UserDailyLimit.objects.filter(condition).update(**{
+            field: Case(*field_cases, default=F(field))
+            for field, field_cases in cases.items() if field_cases
+        })
+
 
 @receiver(post_delete, sender=Review)
 def decrease_review_count_on_delete(sender, instance, **kwargs):
-    """هنگام حذف نظر، review_count کاربر را کاهش بده"""
-    try:
-        # پیدا کردن رکورد محدودیت برای روز ایجاد نظر
-        limit_date = instance.created_at.date()
-        daily_limit = UserDailyLimit.objects.filter(
-            user=instance.user,
-            date=limit_date
-        ).first()
-        
-        if daily_limit:
-            daily_limit.decrement_review()
-            print(f"✓ کاهش review_count برای کاربر {instance.user.username} در تاریخ {limit_date}")
-    except Exception as e:
-        print(f"✗ خطا در کاهش review_count: {e}")
+    """هنگام حذف نظر، review_count کاربر و در صورت لزوم آمار استاد را به‌روز کن"""
+    batch = DeleteCounterBatch.current()
+    batch.add_deleted_post(instance, 'review_count')
+    if instance.is_approved:
+        batch.professor_ids.add(instance.professor_id)
+    batch.schedule()
 
 
 @receiver(post_delete, sender=Question)
 def decrease_question_count_on_delete(sender, instance, **kwargs):
     """هنگام حذف پرسش، question_count کاربر را کاهش بده"""
-    try:
-        # پیدا کردن رکورد محدودیت برای روز ایجاد پرسش
-        limit_date = instance.created_at.date()
-        daily_limit = UserDailyLimit.objects.filter(
-            user=instance.user,
-            date=limit_date
-        ).first()
-        
-        if daily_limit:
-            daily_limit.decrement_question()
-            print(f"✓ کاهش question_count برای کاربر {instance.user.username} در تاریخ {limit_date}")
-    except Exception as e:
-        print(f"✗ خطا در کاهش question_count: {e}")
+    batch = DeleteCounterBatch.current()
+    batch.add_deleted_post(instance, 'question_count')
+    batch.schedule()
+
+
+@receiver(post_delete, sender=Vote)
+def decrease_vote_counters_on_delete(sender, instance, **kwargs):
+    """
+    رأی حذف‌شده بیرون از موتور رأی (ادمین یا حذف آبشاری کاربر): شمارنده‌های هدف
+    و نسخه محتوای استاد در پایان تراکنش یک‌جا به‌روز می‌شوند. موتور رأی با DELETE
+    مستقیم حذف می‌کند و این سیگنال را نمی‌فرستد.
+    """
+    batch = DeleteCounterBatch.current()
+    batch.add_deleted_vote(instance)
+    batch.schedule()
+
+
+def delete_votes_on_target_delete(sender, instance, **kwargs):
+    """
+    هنگام حذف هدف رأی، رأی‌های آن در پایان تراکنش پاک می‌شوند.
+    برای هر مدل ثبت‌شده در voting.VOTE_KINDS وصل می‌شود.
+    """
+    batch = DeleteCounterBatch.current()
+    batch.vote_targets[sender._meta.model_name].add(instance.pk)
+    batch.schedule()
+
+
+# =========================
+# سیگنال‌ها برای به‌روزرسانی آمار امتیاز استاد
+# =========================
+
+@receiver(post_save, sender=Review)
+def update_professor_rating_on_save(sender, instance, created, **kwargs):
+    """هنگام ثبت یا ویرایش نظر، آمار امتیاز استاد را به‌روز کن"""
+    # نظر جدیدِ تأیید نشده تأثیری روی آمار ندارد
+    if created and not instance.is_approved:
+        return
+    Professor.refresh_rating_stats([instance.professor_id])
+
+
+# =========================
+# سیگنال‌ها برای همگام نگه داشتن ایندکس جستجو
+# =========================
+
+@receiver(post_save, sender=Professor)
+@receiver(post_delete, sender=Professor)
+def update_search_index_on_professor_change(sender, instance, **kwargs):
+    from .search import invalidate_memory_indexes, schedule_reindex
+    schedule_reindex([instance.pk])
+    transaction.on_commit(invalidate_memory_indexes)
+    # آمار دپارتمان فعلی و (در صورت تغییر) دپارتمان قبلی؛ فاست‌ها هم باطل می‌شوند
+    Department.refresh_stats({instance.canonical_department_id, getattr(instance, '_previous_department_id', None)})
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=Question)
+def update_search_index_on_post_save(sender, instance, created, **kwargs):
+    """متن نظر/پرسش فقط پس از تأیید وارد ایندکس می‌شود"""
+    if created and not instance.is_approved:
+        return
+    from .search import schedule_reindex
+    schedule_reindex([instance.professor_id])
+
+
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=Question)
+def update_search_index_on_post_delete(sender, instance, **kwargs):
+    if instance.is_approved:
+        from .search import schedule_reindex
+        schedule_reindex([instance.professor_id])
+
+
+# =========================
+# سیگنال‌ها برای افزایش نسخه محتوای صفحه استاد (کش قطعه‌ها و ETag)
+# =========================
+def _professor_ids_through(instance, descriptor, model):
+    """شناسه استاد از طریق رابطه (بدون کوئری اگر شیء مرتبط از قبل بارگذاری شده باشد)"""
+    if descriptor.is_cached(instance):
+        return [getattr(instance, descriptor.field.name).professor_id]
+    # در حذف آبشاری شیء مرتبط ممکن است پاک شده باشد؛ سیگنال خود آن نسخه را عوض می‌کند
+    return model.objects.filter(
+        pk=getattr(instance, descriptor.field.attname)
+    ).values_list('professor_id', flat=True)
+
+
+@receiver(post_save, sender=Professor)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def bump_content_on_professor_content_change(sender, instance, **kwargs):
+    from .caching import bump_professor_content
+    bump_professor_content([instance.pk if sender is Professor else instance.professor_id])
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def bump_content_on_answer_change(sender, instance, **kwargs):
+    from .caching import bump_professor_content
+    bump_professor_content(_professor_ids_through(instance, Answer.question, Question))
+
+
+@receiver(post_save, sender=Vote)
+def bump_content_on_vote_change(sender, instance, **kwargs):
+    from .caching import bump_professor_content
+    from .voting import VOTE_KINDS
+    vote_kind = VOTE_KINDS.get(instance.target_type)
+    if vote_kind is not None:
+        bump_professor_content(vote_kind.professor_ids([instance.target_id]))
 
 
 # =========================
 # تابع برای رفع مشکل داده‌های فعلی
 # =========================
-def fix_current_daily_limits():
-    """رفع مشکل محدودیت‌های روزانه فعلی"""
+def fix_current_daily_limits(since=None, user=None, dry_run=False, batch_size=500, log=None):
+    """
+    رفع مشکل محدودیت‌های روزانه فعلی به صورت مجموعه‌ای:
+    یک کوئری گروه‌بندی شده روی نظرات و یکی روی پرسش‌ها بر اساس (کاربر، تاریخ)،
+    سپس bulk_update فقط برای رکوردهایی که اختلاف دارند.
+    روز هر پست در منطقه زمانی سایت است، همان timezone.localdate که رکوردها با آن ساخته می‌شوند.
+    خروجی: (تعداد رکوردهای بررسی شده، تعداد رکوردهای اصلاح شده)
+    """
     from django.db.models import Count
-    
-    print("در حال رفع مشکل محدودیت‌های روزانه...")
-    
-    # برای هر کاربر
-    for user in User.objects.all():
-        # پیدا کردن همه رکوردهای محدودیت
-        daily_limits = UserDailyLimit.objects.filter(user=user)
-        
-        for daily_limit in daily_limits:
-            # شمارش واقعی نظرات در آن تاریخ
-            actual_review_count = Review.objects.filter(
-                user=user,
-                created_at__date=daily_limit.date
-            ).count()
-            
-            # شمارش واقعی پرسش‌ها در آن تاریخ
-            actual_question_count = Question.objects.filter(
-                user=user,
-                created_at__date=daily_limit.date
-            ).count()
-            
-            # اگر اختلاف وجود داشت، اصلاح کن
-            if daily_limit.review_count != actual_review_count:
-                print(f"اصلاح review_count کاربر {user.username} در {daily_limit.date}: {daily_limit.review_count} → {actual_review_count}")
-                daily_limit.review_count = actual_review_count
-            
-            if daily_limit.question_count != actual_question_count:
-                print(f"اصلاح question_count کاربر {user.username} در {daily_limit.date}: {daily_limit.question_count} → {actual_question_count}")
-                daily_limit.question_count = actual_question_count
-            
-            daily_limit.save()
-    
-    print("✓ رفع مشکل محدودیت‌های روزانه تکمیل شد.")
\ No newline at end of file
+    from django.db.models.functions import TruncDate
+
+    log = log or (lambda message: None)
+
+    reviews = Review.objects.all()
+    questions = Question.objects.all()
+    daily_limits = UserDailyLimit.objects.all()
+    if since:
+        reviews = reviews.filter(created_at__date__gte=since)
+        questions = questions.filter(created_at__date__gte=since)
+        daily_limits = daily_limits.filter(date__gte=since)
+    if user:
+        reviews = reviews.filter(user=user)
+        questions = questions.filter(user=user)
+        daily_limits = daily_limits.filter(user=user)
+
+    def grouped_counts(queryset):
+        rows = (
+            queryset
+            .annotate(day=TruncDate('created_at', tzinfo=timezone.get_current_timezone()))
+            .order_by()
+            .values_list('user_id', 'day')
+            .annotate(total=Count('id'))
+        )
+        return {(user_id, day): total for user_id, day, total in rows}
+
+    actual_reviews = grouped_counts(reviews)
+    actual_questions = grouped_counts(questions)
+    log(f"شمارش واقعی: {len(actual_reviews)} گروه نظر و {len(actual_questions)} گروه پرسش")
+
+    checked = 0
+    changed = []
+    rows = daily_limits.select_related('user').only(
+        'id', 'date', 'review_count', 'question_count', 'user__username'
+    ).order_by('pk')
+    for daily_limit in rows.iterator(chunk_size=batch_size):
+        checked += 1
+        key = (daily_limit.user_id, daily_limit.date)
+        actual_review_count = actual_reviews.get(key, 0)
+        actual_question_count = actual_questions.get(key, 0)
+
+        if (daily_limit.review_count, daily_limit.question_count) == (actual_review_count, actual_question_count):
+            continue
+
+        log(
+            f"اصلاح کاربر {daily_limit.user.username} در {daily_limit.date}: "
+            f"نظرات {daily_limit.review_count} → {actual_review_count}، "
+            f"پرسش‌ها {daily_limit.question_count} → {actual_question_count}"
+        )
+        daily_limit.review_count = actual_review_count
+        daily_limit.question_count = actual_question_count
+        changed.append(daily_limit)
+
+    if not dry_run:
+        for offset in range(0, len(changed), batch_size):
+            batch = changed[offset:offset + batch_size]
+            UserDailyLimit.objects.bulk_update(batch, ['review_count', 'question_count'])
+            log(f"ذخیره شد: {offset + len(batch)}/{len(changed)}")
+
+    return checked, len(changed)
@@ -0,0 +1,150 @@
+"""
+یکسان‌سازی متن فارسی برای جستجو
+
+کاربران نام‌ها را با ی/ک عربی یا فارسی، با یا بدون نیم‌فاصله و با ارقام
+فارسی، عربی یا لاتین تایپ می‌کنند. normalize_text همه این حالت‌ها را به یک
+شکل واحد تبدیل می‌کند و هم روی کلیدهای ذخیره‌شده و هم روی متن جستجو اعمال
+می‌شود. پیاده‌سازی فقط از str.translate و یک regex از پیش کامپایل‌شده
+استفاده می‌کند تا برای هر کلید در جستجوی زنده به اندازه کافی سریع باشد.
+
+transliteration_key یک اسکلت آوایی لاتین (فقط صامت‌ها) از نام می‌سازد تا
+«ahmadi» و «احمدی» به یک کلید برسند.
+"""
+import re
+
+_CHARACTER_MAP = {
+    # حروف عربی → فارسی
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    # نیم‌فاصله و کاراکترهای نامرئی مشابه حذف می‌شوند
+    '\u200c': '', '\u200d': '', '\u200e': '', '\u200f': '', '\ufeff': '',
+    # کشیده
+    'ـ': '',
+}
+# ارقام فارسی و عربی → لاتین
+_CHARACTER_MAP.update({persian: str(digit) for digit, persian in enumerate('۰۱۲۳۴۵۶۷۸۹')})
+_CHARACTER_MAP.update({arabic: str(digit) for digit, arabic in enumerate('٠١٢٣٤٥٦٧٨٩')})
+# اعراب (فتحه، کسره، ضمه، تنوین، تشدید، سکون و ...)
+_CHARACTER_MAP.update({chr(code): '' for code in range(0x064B, 0x0660)})
+_CHARACTER_MAP['ٰ'] = ''
+
+_TRANSLATION = str.maketrans(_CHARACTER_MAP)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """یکسان‌سازی حروف، ارقام، اعراب، نیم‌فاصله و فاصله‌ها؛ خروجی با حروف کوچک"""
+    if not text:
+        return ''
+    return _WHITESPACE_RE.sub(' ', text.translate(_TRANSLATION)).strip().casefold()
+
+
+# =========================
+# کلید آوایی لاتین (فینگلیش)
+# =========================
+# مصوت‌های کوتاه در فارسی نوشته نمی‌شوند و ا/و/ی نقش مصوت هم دارند؛ پس کلید
+# فقط از صامت‌ها ساخته می‌شود و حروف هم‌صدا (س/ص/ث، ز/ذ/ض/ظ و ...) یکی می‌شوند.
+_PERSIAN_CONSONANTS = {
+    'ب': 'b', 'پ': 'p', 'ت': 't', 'ط': 't', 'ث': 's', 'س': 's', 'ص': 's',
+    'ج': 'j', 'چ': 'ch', 'ح': 'h', 'ه': 'h', 'خ': 'kh', 'د': 'd',
+    'ذ': 'z', 'ز': 'z', 'ژ': 'z', 'ض': 'z', 'ظ': 'z', 'ر': 'r', 'ش': 'sh',
+    'غ': 'q', 'ق': 'q', 'ف': 'f', 'ک': 'k', 'گ': 'g', 'ل': 'l', 'م': 'm', 'ن': 'n',
+}
+_LATIN_DIGRAPHS = (('gh', 'q'), ('ph', 'f'), ('zh', 'z'), ('ck', 'k'), ('ou', 'u'), ('ee', 'i'), ('oo', 'u'))
+_LATIN_LETTERS = {'c': 'k', 'x': 'ks', 'w': 'v'}
+_LATIN_VOWELS = frozenset('aeiou')
+_LATIN_SILENT_AFTER_FIRST = frozenset('vy')
+_PERSIAN_LETTER_RE = re.compile(r'[\u0600-\u06FF]')
+_LATIN_LETTER_RE = re.compile(r'[a-z]')
+_DUPLICATE_RE = re.compile(r'(.)\1+')
+_WORD_RE = re.compile(r'\w+')
+
+# عنوان‌هایی که جزو نام نیستند و در کلید نمی‌آیند
+TITLE_WORDS = frozenset({'دکتر', 'استاد', 'مهندس', 'پروفسور', 'dr', 'prof', 'doctor', 'ostad', 'mohandes'})
+
+
+def is_latin(text):
+    """آیا متن (یکسان‌سازی شده) حروف لاتین دارد و هیچ حرف فارسی ندارد؟"""
+    return bool(_LATIN_LETTER_RE.search(text)) and not _PERSIAN_LETTER_RE.search(text)
+
+
+def _persian_word_key(word):
+    letters = []
+    for position, char in enumerate(word):
+        if position == 0 and char == 'و':
+            letters.append('v')
+        elif position == 0 and char == 'ی':
+            letters.append('y')
+        elif char == 'ه' and position == len(word) - 1 and position > 0:
+            # «ه» پایانی (زاده، فقیه) معمولاً مصوت است و در فینگلیش گاهی نوشته نمی‌شود
+            continue
+        else:
+            # ا/ع/ء و و/ی میانی (مصوت) در نگاشت نیستند و کنار گذاشته می‌شوند
+            letters.append(_PERSIAN_CONSONANTS.get(char, ''))
+    return ''.join(letters)
+
+
+def _latin_word_key(word):
+    for digraph, replacement in _LATIN_DIGRAPHS:
+        word = word.replace(digraph, replacement)
+    # «ch» پیش از جایگزینی c→k حفظ می‌شود
+    word = word.replace('ch', '\0')
+    if len(word) > 1 and word.endswith('h') and word[-2] in _LATIN_VOWELS:
+        word = word[:-1]
+    letters = []
+    for position, char in enumerate(word):
+        if char == '\0':
+            letters.append('ch')
+        elif char in _LATIN_VOWELS or (position > 0 and char in _LATIN_SILENT_AFTER_FIRST):
+            continue
+        elif char.isascii() and char.isalpha():
+            letters.append(_LATIN_LETTERS.get(char, char))
+    return ''.join(letters)
+
+
+def transliteration_key(text, surname_first=True):
+    """
+    کلید آوایی لاتین متن (فارسی یا فینگلیش).
+    با surname_first آخرین کلمه (معمولاً نام خانوادگی) به ابتدای کلید می‌آید تا
+    جستجوی پیشوندی روی ستون ایندکس‌شده با نام خانوادگی هم کار کند.
+    """
+    words = [word for word in _WORD_RE.findall(normalize_text(text)) if word not in TITLE_WORDS]
+    keys = []
+    for word in words:
+        key = _latin_word_key(word) if is_latin(word) else _persian_word_key(word)
+        key = _DUPLICATE_RE.sub(r'\1', key)
+        if key:
+            keys.append(key)
+    if surname_first and len(keys) > 1:
+        keys = keys[-1:] + keys[:-1]
+    return ' '.join(keys)
+
+
+# =========================
+# کلید دپارتمان
+# =========================
+# پیشوندهای سازمانی که در نام دپارتمان‌ها اختیاری نوشته می‌شوند؛ «دانشکده فیزیک»
+# و «گروه آموزشی فیزیک» هر دو به کلید «فیزیک» می‌رسند. «مهندسی» جزو آن‌ها نیست،
+# چون «مهندسی شیمی» و «شیمی» (یا «مهندسی پزشکی» و «پزشکی») دپارتمان‌های جدا هستند.
+DEPARTMENT_NOISE_WORDS = frozenset({
+    'دانشکده', 'گروه', 'رشته', 'دپارتمان', 'اموزشی',
+    'department', 'faculty', 'school', 'of',
+})
+
+# کوتاه‌نوشت‌هایی که فقط یک دپارتمان را می‌رسانند: {کلید کوتاه: کلید کامل}
+DEPARTMENT_ALIASES = {
+    'کامپیوتر': 'مهندسی کامپیوتر',
+    'برق': 'مهندسی برق',
+    'عمران': 'مهندسی عمران',
+    'مکانیک': 'مهندسی مکانیک',
+}
+
+
+def department_key(text):
+    """کلید یکتای دپارتمان برای خوشه‌بندی نام‌های مختلف یک دپارتمان"""
+    words = _WORD_RE.findall(normalize_text(text))
+    key = ' '.join([word for word in words if word not in DEPARTMENT_NOISE_WORDS] or words)
+    return DEPARTMENT_ALIASES.get(key, key)
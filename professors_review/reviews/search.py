@@ -0,0 +1,446 @@
+"""
+سرویس جستجوی اساتید
+
+روی SQLite از یک جدول مجازی FTS5 (reviews_professor_fts) با رتبه‌بندی bm25
+و تطبیق پیشوندی استفاده می‌کند. هر ردیف این جدول با rowid برابر شناسه استاد،
+نام، دپارتمان، بیوگرافی و متن نظرات و پرسش‌های تأیید شده او را نگه می‌دارد.
+روی دیتابیس‌های دیگر (یا اگر جدول ساخته نشده باشد) به جستجوی contains روی
+کلیدهای یکسان‌سازی شده برمی‌گردد. متن ایندکس و متن جستجو هر دو از
+normalize_text عبور می‌کنند. جستجوی لاتین (فینگلیش) ابتدا با تطبیق پیشوندی
+روی ستون ایندکس‌شده search_latin (با شرط بازه) انجام می‌شود.
+"""
+import bisect
+import re
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+
+from .batching import OnCommitBatch
+from .models import Department, Professor, Question, Review
+from .normalization import is_latin, normalize_text, transliteration_key
+
+FTS_TABLE = 'reviews_professor_fts'
+
+# وزن ستون‌ها در bm25: نام، دپارتمان، بیوگرافی، متن نظرات/پرسش‌ها
+COLUMN_WEIGHTS = (10.0, 4.0, 1.5, 1.0)
+
+# تعداد شناسه در هر دستور DELETE/SELECT برای ماندن زیر محدودیت پارامترهای SQLite
+CHUNK_SIZE = 500
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# نبودن جدول FTS هم کش می‌شود، ولی هر چند ثانیه دوباره بررسی می‌شود تا جدولی که
+# بعداً (مثلاً با migrate در پروسس دیگر) ساخته شود دیده شود
+FTS_RECHECK_INTERVAL = 60
+_fts_checked = {'available': False, 'checked_at': None}
+
+
+def fts_available():
+    """آیا جدول FTS5 روی دیتابیس فعلی وجود دارد؟ (نتیجه مثبت تا reset و منفی FTS_RECHECK_INTERVAL ثانیه کش می‌شود)"""
+    if connection.vendor != 'sqlite':
+        return False
+    checked_at = _fts_checked['checked_at']
+    if checked_at is None or (
+        not _fts_checked['available'] and time.monotonic() - checked_at > FTS_RECHECK_INTERVAL
+    ):
+        _fts_checked['available'] = FTS_TABLE in connection.introspection.table_names()
+        _fts_checked['checked_at'] = time.monotonic()
+    return _fts_checked['available']
+
+
+def reset_fts_available(**kwargs):
+    """فراموش کردن نتیجه کش‌شده fts_available (گیرنده post_migrate)"""
+    _fts_checked['checked_at'] = None
+
+
+def build_match_expression(query):
+    """تبدیل متن کاربر به عبارت MATCH امن: هر کلمه یک پیشوند در نقل‌قول"""
+    terms = _TOKEN_RE.findall(query)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def find_professors(query, limit=None):
+    """
+    جستجوی اساتید؛ خروجی یک QuerySet از Professor.
+    با متن خالی همه اساتید به ترتیب پیش‌فرض برگردانده می‌شوند.
+    """
+    if not normalize_text(query):
+        professors = Professor.objects.all()
+        return professors[:limit] if limit else professors
+    return professors_in_order(find_professor_ids(query, limit=limit))
+
+
+def find_professor_ids(query, department=None, limit=None):
+    """
+    شناسه اساتید منطبق با متن جستجو به ترتیب ارتباط (bm25 روی FTS5)، در صورت
+    نیاز محدود به یک دپارتمان. فقط شناسه‌ها خوانده می‌شوند تا صفحه‌بندی پیش از
+    بارگذاری ردیف‌ها انجام شود و professors_in_order فقط برای یک صفحه اجرا شود.
+    """
+    query = normalize_text(query)
+    professors = Professor.objects.all()
+    if department:
+        professors = professors.filter(canonical_department_id=department)
+
+    def ids_of(queryset):
+        ids = queryset.values_list('pk', flat=True)
+        return list(ids[:limit] if limit else ids)
+
+    if not query:
+        return ids_of(professors)
+
+    match = build_match_expression(query)
+    if not match:
+        return []
+
+    if is_latin(query):
+        ids = ids_of(find_professors_by_transliteration(query, professors))
+        if ids:
+            return ids
+
+    if not fts_available():
+        return ids_of(professors.filter(Q(search_name__contains=query) | Q(search_department__contains=query)))
+
+    sql = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+    params = [match]
+    if department:
+        qn = connection.ops.quote_name
+        sql += (
+            f' AND rowid IN (SELECT {qn(Professor._meta.pk.column)} FROM {qn(Professor._meta.db_table)} '
+            f'WHERE {qn(Professor._meta.get_field("canonical_department").column)} = %s)'
+        )
+        params.append(department)
+    sql += f' ORDER BY bm25({FTS_TABLE}, {", ".join(str(w) for w in COLUMN_WEIGHTS)})'
+    if limit:
+        sql += ' LIMIT %s'
+        params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def find_professors_by_transliteration(query, professors=None):
+    """
+    تطبیق متن لاتین با کلید آوایی نام اساتید. کلید ذخیره‌شده با نام خانوادگی
+    شروع می‌شود؛ پس متن جستجو هم به همان ترتیب و هم به ترتیب اصلی امتحان می‌شود
+    تا «ali ahmadi»، «ahmadi ali» و «ahmadi» همگی پیدا شوند.
+    """
+    professors = Professor.objects.all() if professors is None else professors
+    keys = {transliteration_key(query), transliteration_key(query, surname_first=False)} - {''}
+    if not keys:
+        return professors.none()
+    # بازه به جای startswith: LIKE در SQLite حساس به حروف نیست و از ایندکس استفاده نمی‌کند
+    condition = Q()
+    for key in keys:
+        condition |= Q(search_latin__gte=key, search_latin__lt=key + '\uffff')
+    return professors.filter(condition)
+
+
+def professors_in_order(ids):
+    """QuerySet اساتید با همان ترتیب شناسه‌های داده شده"""
+    if not ids:
+        return Professor.objects.none()
+    ranking = Case(
+        *[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+        output_field=IntegerField()
+    )
+    return Professor.objects.filter(pk__in=ids).order_by(ranking)
+
+
+def reindex_professors(professor_ids):
+    """بازسازی ردیف‌های FTS برای اساتید داده شده (اساتید حذف شده فقط پاک می‌شوند)"""
+    professor_ids = sorted({pk for pk in professor_ids if pk is not None})
+    if not professor_ids or not fts_available():
+        return
+
+    for offset in range(0, len(professor_ids), CHUNK_SIZE):
+        chunk = professor_ids[offset:offset + CHUNK_SIZE]
+        texts = {pk: [] for pk in chunk}
+        for model in (Review, Question):
+            rows = model.objects.filter(
+                professor_id__in=chunk, is_approved=True
+            ).order_by().values_list('professor_id', 'text')
+            for professor_id, text in rows:
+                texts[professor_id].append(normalize_text(text))
+
+        rows = [
+            (pk, name, department, normalize_text(bio), '\n'.join(texts[pk]))
+            for pk, name, department, bio in Professor.objects.filter(
+                pk__in=chunk
+            ).values_list('pk', 'search_name', 'search_department', 'bio')
+        ]
+
+        placeholders = ', '.join(['%s'] * len(chunk))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', chunk)
+            if rows:
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, name, department, bio, content) '
+                    f'VALUES (%s, %s, %s, %s, %s)',
+                    rows
+                )
+
+
+def rebuild_index():
+    """بازسازی کامل ایندکس از روی همه اساتید"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    reindex_professors(Professor.objects.values_list('pk', flat=True))
+
+
+class _PendingReindex(OnCommitBatch):
+    """اساتیدی که در تراکنش جاری تغییر کرده‌اند؛ یک بار و در پایان تراکنش ایندکس می‌شوند"""
+
+    def __init__(self):
+        self.professor_ids = set()
+
+    def apply(self):
+        reindex_professors(self.professor_ids)
+
+
+def schedule_reindex(professor_ids):
+    """ثبت اساتید برای ایندکس مجدد پس از commit تراکنش جاری"""
+    batch = _PendingReindex.current()
+    batch.professor_ids.update(professor_ids)
+    batch.schedule()
+
+
+# =========================
+# ایندکس‌های درون حافظه روی نام و دپارتمان اساتید
+# =========================
+PROFESSOR_INDEX_VERSION_KEY = 'reviews:professor-memory-index-version'
+
+
+class _LazyProfessorIndex(ABC):
+    """
+    پایه ایندکس‌های درون حافظه: به صورت تنبل از روی search_name/search_department
+    ساخته می‌شوند و با تغییر Professor (از طریق نسخه‌ای در کش) یا پس از
+    MAX_AGE ثانیه دوباره ساخته می‌شوند تا پروسه‌های دیگر هم بی‌خبر نمانند.
+    """
+
+    MAX_AGE = 300
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built_at = None
+        self._version = None
+
+    @abstractmethod
+    def _load(self, rows):
+        """ساختن ایندکس از ردیف‌های (pk، name، search_name، search_department) به ترتیب search_name"""
+
+    def _is_stale(self, version):
+        return (
+            self._built_at is None
+            or version != self._version
+            or time.monotonic() - self._built_at > self.MAX_AGE
+        )
+
+    def _ensure_fresh(self):
+        version = cache.get(PROFESSOR_INDEX_VERSION_KEY)
+        if not self._is_stale(version):
+            return
+        with self._lock:
+            # ممکن است thread دیگری همین حالا ایندکس را ساخته باشد
+            if not self._is_stale(version):
+                return
+            rows = Professor.objects.order_by('search_name').values_list(
+                'pk', 'name', 'search_name', 'search_department'
+            )
+            self._load(list(rows))
+            self._built_at = time.monotonic()
+            self._version = version
+
+    def invalidate(self):
+        self._built_at = None
+
+
+class ProfessorPrefixIndex(_LazyProfessorIndex):
+    """
+    آرایه‌های مرتب از کلیدهای یکسان‌سازی شده نام و دپارتمان اساتید.
+    برای هر کلمه نام یک کلید (از آن کلمه تا انتهای نام) ساخته می‌شود تا
+    «احم» هم «احمدی» و هم «دکتر احمدی» را پیدا کند. جستجو با bisect انجام
+    می‌شود و فقط به اندازه تعداد نتایج لازم پیمایش می‌کند.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._name_entries = []
+        self._department_entries = []
+
+    @staticmethod
+    def _suffixes(text):
+        words = text.split()
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    def _load(self, rows):
+        name_entries = []
+        department_entries = []
+        for pk, name, search_name, search_department in rows:
+            name_entries.extend((key, pk) for key in self._suffixes(search_name))
+            department_entries.extend((key, pk) for key in self._suffixes(search_department))
+        name_entries.sort()
+        department_entries.sort()
+        self._name_entries = name_entries
+        self._department_entries = department_entries
+
+    @staticmethod
+    def _scan(entries, prefix, limit, found):
+        position = bisect.bisect_left(entries, (prefix,))
+        while position < len(entries) and len(found) < limit:
+            key, pk = entries[position]
+            if not key.startswith(prefix):
+                break
+            found.setdefault(pk, None)
+            position += 1
+
+    def lookup(self, query, limit):
+        """شناسه حداکثر limit استاد که نام (و سپس دپارتمان) آن‌ها با query شروع می‌شود"""
+        prefix = normalize_text(query)
+        if not prefix:
+            return []
+        self._ensure_fresh()
+        # dict برای حذف تکرار با حفظ ترتیب
+        found = {}
+        self._scan(self._name_entries, prefix, limit, found)
+        self._scan(self._department_entries, prefix, limit, found)
+        return list(found)
+
+
+class ProfessorTrigramIndex(_LazyProfessorIndex):
+    """
+    ایندکس معکوس سه‌حرفی (trigram) برای جستجوی مقاوم به غلط املایی.
+    شباهت مثل pg_trgm برابر نسبت سه‌حرفی‌های مشترک به کل سه‌حرفی‌هاست.
+    عنوان‌هایی مثل «دکتر» که در همه نام‌ها تکرار می‌شوند کنار گذاشته می‌شوند
+    تا لیست‌های معکوس کوتاه بمانند.
+    """
+
+    SIMILARITY_CUTOFF = 0.3
+    STOP_WORDS = frozenset({'دکتر', 'استاد', 'مهندس', 'پروفسور', 'dr'})
+
+    def __init__(self):
+        super().__init__()
+        self._postings = {}
+        self._sizes = {}
+        self._names = {}
+
+    @classmethod
+    def trigrams(cls, text):
+        grams = set()
+        for word in text.split():
+            if word in cls.STOP_WORDS:
+                continue
+            padded = f'  {word} '
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return grams
+
+    def _load(self, rows):
+        postings = {}
+        sizes = {}
+        names = {}
+        for pk, name, search_name, search_department in rows:
+            names[pk] = name
+            for field, text in (('name', search_name), ('department', search_department)):
+                grams = self.trigrams(text)
+                if not grams:
+                    continue
+                sizes[(pk, field)] = len(grams)
+                for gram in grams:
+                    postings.setdefault(gram, []).append((pk, field))
+        self._postings = postings
+        self._sizes = sizes
+        self._names = names
+
+    def similar(self, query, limit, cutoff=None):
+        """
+        اساتید مشابه query به ترتیب شباهت.
+        خروجی: لیست (شناسه، شباهت، فیلد منطبق) با شباهت حداقل cutoff
+        """
+        cutoff = self.SIMILARITY_CUTOFF if cutoff is None else cutoff
+        query_grams = self.trigrams(normalize_text(query))
+        if not query_grams:
+            return []
+        self._ensure_fresh()
+
+        overlaps = {}
+        for gram in query_grams:
+            for doc in self._postings.get(gram, ()):
+                overlaps[doc] = overlaps.get(doc, 0) + 1
+
+        best = {}
+        for (pk, field), shared in overlaps.items():
+            score = shared / (len(query_grams) + self._sizes[(pk, field)] - shared)
+            if score >= cutoff and score > best.get(pk, (0, None))[0]:
+                best[pk] = (score, field)
+
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], self._names[item[0]]))
+        return [(pk, score, field) for pk, (score, field) in ranked[:limit]]
+
+    def name_of(self, pk):
+        return self._names.get(pk)
+
+
+professor_prefix_index = ProfessorPrefixIndex()
+professor_trigram_index = ProfessorTrigramIndex()
+
+
+def invalidate_memory_indexes():
+    """پس از تغییر Professor: این پروسه فوراً و بقیه با تغییر نسخه در کش"""
+    professor_prefix_index.invalidate()
+    professor_trigram_index.invalidate()
+    cache.set(PROFESSOR_INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def find_similar_professors(query, limit=20):
+    """
+    جایگزین وقتی جستجوی دقیق نتیجه‌ای ندارد.
+    خروجی: (QuerySet اساتید مشابه به ترتیب شباهت، پیشنهاد «منظورتان ... بود؟»)
+    """
+    matches = professor_trigram_index.similar(query, limit)
+    suggestion = next(
+        (professor_trigram_index.name_of(pk) for pk, score, field in matches if field == 'name'),
+        None
+    )
+    return professors_in_order([pk for pk, score, field in matches]), suggestion
+
+
+# =========================
+# فاست دپارتمان‌ها (تعداد اساتید و میانگین امتیاز هر دپارتمان)
+# =========================
+DEPARTMENT_FACETS_CACHE_KEY = 'reviews:department-facets'
+# با به‌روزرسانی آمار Department باطل می‌شود؛ TTL فقط احتیاط است
+DEPARTMENT_FACETS_TIMEOUT = 60 * 60
+
+
+def department_facets():
+    """
+    لیست دپارتمان‌های دارای استاد به ترتیب نام:
+    [{'id', 'department', 'count', 'average_rating'}, ...]
+    از آمار ذخیره‌شده روی Department خوانده و تا تغییر بعدی آمار کش می‌شود.
+    """
+    facets = cache.get(DEPARTMENT_FACETS_CACHE_KEY)
+    if facets is not None:
+        return facets
+
+    departments = Department.objects.filter(professor_count__gt=0).order_by('name')
+    facets = [
+        {
+            'id': department.pk,
+            'department': department.name,
+            'count': department.professor_count,
+            'average_rating': department.average_rating,
+        }
+        for department in departments
+    ]
+    cache.set(DEPARTMENT_FACETS_CACHE_KEY, facets, DEPARTMENT_FACETS_TIMEOUT)
+    return facets
+
+
+def invalidate_department_facets():
+    cache.delete(DEPARTMENT_FACETS_CACHE_KEY)
@@ -1,3 +1,1036 @@
+import datetime
+import os
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models.signals import post_delete, post_migrate
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import DAILY_REVIEW_LIMIT, DeleteCounterBatch, Department, Professor, Review, Question, Answer, UserDailyLimit, Vote
+from .normalization import department_key
+from .search import FTS_RECHECK_INTERVAL, department_facets, fts_available, find_professors, find_professors_by_transliteration, professor_prefix_index, professor_trigram_index, reset_fts_available
+from .vote_buffer import VoteBuffer
+from .voting import VoteKind, user_votes
+from .views import HOME_PAGE_SIZE, HOME_SORTS, QUESTIONS_PAGE_SIZE, REVIEWS_PAGE_SIZE, decode_cursor, encode_cursor, keyset_queryset, review_page
+
+
+class ProfessorRatingStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='pass12345')
+        self.professor = Professor.objects.create(name='دکتر احمدی', department='مهندسی کامپیوتر')
+
+    def _review(self, rating, is_approved=True):
+        return Review.objects.create(
+            professor=self.professor, user=self.user,
+            text='نظر آزمایشی درباره استاد', rating=rating, is_approved=is_approved
+        )
+
+    def test_stats_follow_approval_and_delete(self):
+        self._review(5)
+        pending = self._review(2, is_approved=False)
+        self.professor.refresh_from_db()
+        self.assertEqual(self.professor.review_count, 1)
+        self.assertEqual(self.professor.average_rating, 5.0)
+
+        pending.is_approved = True
+        pending.save()
+        self.professor.refresh_from_db()
+        self.assertEqual(self.professor.review_count, 2)
+        self.assertEqual(self.professor.rating_histogram, [0, 1, 0, 0, 1])
+        self.assertEqual(self.professor.average_rating, 3.5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pending.delete()
+        self.professor.refresh_from_db()
+        self.assertEqual(self.professor.rating_sum, 5)
+        self.assertEqual(self.professor.rating_histogram, [0, 0, 0, 0, 1])
+
+    def test_home_does_not_query_per_professor(self):
+        for i in range(5):
+            Professor.objects.create(name=f'استاد {i}')
+        self._review(4)
+        department_facets()
+        # صفحه اول فقط یک SELECT است (بدون COUNT؛ فاست‌ها از کش)
+        with self.assertNumQueries(1):
+            self.client.get(reverse('reviews:home'))
+
+    def test_home_sorts_by_stored_columns_and_paginates(self):
+        popular = Professor.objects.create(name='استاد پرنظر')
+        for rating in (4, 5):
+            Review.objects.create(professor=popular, user=self.user, text='نظر آزمایشی درباره استاد', rating=rating, is_approved=True)
+        self._review(2)
+        for i in range(3):
+            Professor.objects.create(name=f'استاد بی‌نظر {i}')
+        self.professor.refresh_from_db()
+        self.assertEqual(self.professor.rating_average, 2.0)
+        self.assertIsNotNone(self.professor.last_review_at)
+
+        professors = list(Professor.objects.all())
+        expected = {
+            'name': sorted(professors, key=lambda p: (p.name, p.pk)),
+            'rating': sorted(professors, key=lambda p: (-p.rating_average, p.pk)),
+            'reviews': sorted(professors, key=lambda p: (-p.review_count, p.pk)),
+            'recent': sorted(professors, key=lambda p: (
+                p.last_review_at is None, -p.last_review_at.timestamp() if p.last_review_at else 0, p.pk
+            )),
+        }
+        # صفحه‌های دوتایی تا مرز NULL در «فعالیت اخیر» وسط صفحه دوم بیفتد
+        with mock.patch('reviews.views.HOME_PAGE_SIZE', 2):
+            for sort, order in expected.items():
+                seen, params = [], {'sort': sort}
+                while True:
+                    response = self.client.get(reverse('reviews:home'), params)
+                    seen += response.context['professors']
+                    if response.context['next_after'] is None:
+                        break
+                    self.assertContains(response, f"&after={response.context['next_after']}")
+                    params['after'] = response.context['next_after']
+                self.assertEqual(seen, order, sort)
+        self.assertEqual(self.client.get(reverse('reviews:home'), {'sort': 'bogus'}).context['sort'], 'name')
+
+
+class VoteCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='voter', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            professor = Professor.objects.create(name='دکتر محمدی')
+            self.review = Review.objects.create(
+                professor=professor, user=self.user,
+                text='نظر آزمایشی درباره استاد', rating=4, is_approved=True
+            )
+        self.client.force_login(self.user)
+
+    def _vote(self, value):
+        response = self.client.post(reverse('reviews:vote_review'), {'review_id': self.review.id, 'value': value})
+        return response.json()
+
+    def test_toggle_updates_stored_counters(self):
+        self.assertEqual(self._vote(1), {'likes_count': 1, 'dislikes_count': 0})
+        self.assertEqual(self._vote(-1), {'likes_count': 0, 'dislikes_count': 1})
+        self.assertEqual(self._vote(-1), {'likes_count': 0, 'dislikes_count': 0})
+        self.assertFalse(Vote.objects.exists())
+        self.review.refresh_from_db()
+        self.assertEqual((self.review.likes_count, self.review.dislikes_count), (0, 0))
+
+    def test_vote_is_one_counter_update_and_one_upsert(self):
+        # session، کاربر، UPDATE شمارنده با RETURNING و upsert رأی
+        with self.assertNumQueries(4):
+            self.assertEqual(self._vote(1), {'likes_count': 1, 'dislikes_count': 0})
+        # کلیک دوباره رأی را برمی‌دارد و دوباره ثبت می‌کند، بدون IntegrityError
+        self.assertEqual(self._vote(1), {'likes_count': 0, 'dislikes_count': 0})
+        self.assertEqual(self._vote(1), {'likes_count': 1, 'dislikes_count': 0})
+        self.assertEqual(Vote.objects.get().value, 1)
+
+    def test_answer_vote_bumps_professor_through_question(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            question = Question.objects.create(
+                professor=self.review.professor, user=self.user, text='پرسش آزمایشی', is_approved=True
+            )
+            answer = Answer.objects.create(question=question, user=self.user, text='پاسخ آزمایشی', is_approved=True)
+        version = Professor.objects.get().content_version
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('reviews:vote_answer_ajax'), {'answer_id': answer.id, 'value': -1})
+        self.assertEqual(response.json(), {'likes_count': 0, 'dislikes_count': 1})
+        self.assertEqual(Professor.objects.get().content_version, version + 1)
+
+    def test_batch_applies_votes_in_click_order_with_constant_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            others = [
+                Review.objects.create(
+                    professor=self.review.professor, user=self.user,
+                    text=f'نظر دیگر {i}', rating=3, is_approved=True
+                ) for i in range(3)
+            ]
+            question = Question.objects.create(
+                professor=self.review.professor, user=self.user, text='پرسش آزمایشی', is_approved=True
+            )
+            answer = Answer.objects.create(question=question, user=self.user, text='پاسخ آزمایشی', is_approved=True)
+        self._vote(-1)
+
+        votes = [
+            {'kind': 'review', 'id': self.review.pk, 'value': -1},  # برداشتن رأی قبلی
+            {'kind': 'review', 'id': others[0].pk, 'value': 1},
+            {'kind': 'review', 'id': others[1].pk, 'value': 1},
+            {'kind': 'review', 'id': others[1].pk, 'value': -1},  # عوض کردن در همان دسته
+            {'kind': 'answer', 'id': answer.pk, 'value': 1},
+            {'kind': 'answer', 'id': 10 ** 6, 'value': 1},
+        ]
+        # session، کاربر، savepoint، برای نظرات UPDATE/DELETE/upsert و برای پاسخ‌ها UPDATE/upsert
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(9):
+                response = self.client.post(
+                    reverse('reviews:vote_batch'), {'votes': votes}, content_type='application/json'
+                )
+        data = response.json()
+        results = {(item['kind'], item['id']): item for item in data['results']}
+        self.assertEqual(results['review', self.review.pk]['vote'], 0)
+        self.assertEqual(results['review', self.review.pk]['dislikes_count'], 0)
+        self.assertEqual(results['review', others[1].pk]['dislikes_count'], 1)
+        self.assertEqual(results['answer', answer.pk]['likes_count'], 1)
+        self.assertEqual(data['not_found'], [{'kind': 'answer', 'id': 10 ** 6}])
+        self.assertEqual(
+            dict(Vote.objects.filter(target_type='review').values_list('target_id', 'value')), {others[0].pk: 1, others[1].pk: -1}
+        )
+
+    def test_votes_share_one_table_and_are_removed_with_their_target(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            question = Question.objects.create(
+                professor=self.review.professor, user=self.user, text='پرسش آزمایشی', is_approved=True
+            )
+            answer = Answer.objects.create(question=question, user=self.user, text='پاسخ آزمایشی', is_approved=True)
+        # نظر و پاسخ با شناسه برابر رأی‌های جدا دارند
+        Answer.objects.filter(pk=answer.pk).update(id=self.review.pk)
+        self._vote(1)
+        self.client.post(reverse('reviews:vote_answer_ajax'), {'answer_id': self.review.pk, 'value': -1})
+        self.assertEqual(
+            set(Vote.objects.values_list('target_type', 'target_id', 'value')),
+            {('review', self.review.pk, 1), ('answer', self.review.pk, -1)}
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.review.delete()
+        self.assertEqual(list(Vote.objects.values_list('target_type', flat=True)), ['answer'])
+
+    def test_deleting_a_voter_decrements_counters(self):
+        voter = User.objects.create_user(username='leaving-voter', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            self._vote(1)
+            self.client.force_login(voter)
+            self._vote(-1)
+        version = Professor.objects.get().content_version
+        with self.captureOnCommitCallbacks(execute=True):
+            voter.delete()
+        self.review.refresh_from_db()
+        self.assertEqual((self.review.likes_count, self.review.dislikes_count), (1, 0))
+        self.assertGreater(Professor.objects.get().content_version, version)
+
+    def test_malformed_batch_payloads_are_rejected(self):
+        payloads = [
+            '{"votes": [{"kind": ["r"], "id": 1, "value": 1}]}',
+            '{"votes": [{"kind": "review", "id": 1e400, "value": 1}]}',
+            '{"votes": [{"kind": "review", "id": 1, "value": 1e400}]}',
+            '{"votes": [{"kind": "review", "id": 100000000000000000000, "value": 1}]}',
+            '{"votes": [{"kind": "review", "id": 1}]}',
+            '{"votes": "review"}',
+            '[1]',
+            'not json',
+        ]
+        for payload in payloads:
+            response = self.client.post(reverse('reviews:vote_batch'), payload, content_type='application/json')
+            self.assertEqual(response.status_code, 400, payload)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_unapproved_target_is_rejected_without_counting(self):
+        Review.objects.filter(pk=self.review.pk).update(is_approved=False)
+        response = self.client.post(reverse('reviews:vote_review'), {'review_id': self.review.id, 'value': 1})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Vote.objects.exists())
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.likes_count, 0)
+
+
+class VoteBufferTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='voter', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            professor = Professor.objects.create(name='دکتر محمدی')
+            self.review = Review.objects.create(
+                professor=professor, user=self.user,
+                text='نظر آزمایشی درباره استاد', rating=4, is_approved=True
+            )
+        journal_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(journal_dir.cleanup)
+        self.journal = os.path.join(journal_dir.name, 'votes.jsonl')
+        self.buffer = VoteBuffer(self.journal)
+        patcher = mock.patch('reviews.vote_buffer.active_vote_buffer', return_value=self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+
+    def _vote(self, value):
+        response = self.client.post(reverse('reviews:vote_review'), {'review_id': self.review.id, 'value': value})
+        return response.json()
+
+    def test_buffered_votes_are_visible_before_flush(self):
+        self.assertEqual(self._vote(1), {'likes_count': 1, 'dislikes_count': 0})
+        self.assertEqual(self._vote(-1), {'likes_count': 0, 'dislikes_count': 1})
+        self.assertFalse(Vote.objects.exists())
+        self.assertEqual(user_votes(self.user, 'review', [self.review.pk]), {self.review.pk: -1})
+        self.assertEqual(self.buffer.pending_count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(Vote.objects.get().value, -1)
+        self.review.refresh_from_db()
+        self.assertEqual((self.review.likes_count, self.review.dislikes_count), (0, 1))
+        # برداشتن رأی پس از flush از رأی دیتابیس شروع می‌شود
+        self.assertEqual(self._vote(-1), {'likes_count': 0, 'dislikes_count': 0})
+        self.assertEqual(user_votes(self.user, 'review', [self.review.pk]), {})
+
+    def test_buffered_vote_changes_fragment_validators(self):
+        cache.clear()
+        url = reverse('reviews:professor_reviews_page', args=[self.review.professor_id])
+        first_page = {'cursor': encode_cursor(Review(pk=0, created_at=timezone.now() + datetime.timedelta(days=1)))}
+        response = self.client.get(url, first_page)
+        self.assertEqual(response.json()['votes'], {})
+        etag = response['ETag']
+
+        self._vote(1)
+        response = self.client.get(url, first_page, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['votes'], {str(self.review.pk): 1})
+        self.assertEqual(self.client.get(url, first_page, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def _flush_with_vote_during_write(self, fail=False):
+        """flush که حین نوشتن آن همین کاربر رأی تازه می‌دهد؛ خروجی: پاسخ آن رأی و اینکه قفل آزاد بود"""
+        set_votes = VoteKind.set_votes
+        seen = {}
+
+        def writing(vote_kind, user_id, values):
+            def try_lock():
+                seen['lock_free'] = self.buffer._lock.acquire(timeout=1)
+                if seen['lock_free']:
+                    self.buffer._lock.release()
+
+            other = threading.Thread(target=try_lock)
+            other.start()
+            other.join()
+            seen['vote'] = self.buffer.apply(self.user, {'review': {self.review.pk: [-1]}})
+            if fail:
+                raise DatabaseError('نوشتن ناموفق')
+            return set_votes(vote_kind, user_id, values)
+
+        with mock.patch.object(VoteKind, 'set_votes', writing):
+            if fail:
+                with self.assertRaises(DatabaseError):
+                    self.buffer.flush()
+            else:
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.assertEqual(self.buffer.flush(), 1)
+        return seen
+
+    def test_votes_during_flush_wait_for_nothing_and_stay_buffered(self):
+        self._vote(1)
+        seen = self._flush_with_vote_during_write()
+        self.assertTrue(seen['lock_free'])
+        # رأی در حال نوشتن (like) مبنای رأی تازه است
+        self.assertEqual(seen['vote'], {(('review', self.review.pk)): (0, 1, -1)})
+        self.assertEqual(Vote.objects.get().value, 1)
+        self.assertEqual(self.buffer.pending_count(), 1)
+        self.assertEqual(VoteBuffer(self.journal).pending_count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.buffer.flush()
+        self.review.refresh_from_db()
+        self.assertEqual((self.review.likes_count, self.review.dislikes_count), (0, 1))
+        self.assertEqual(Vote.objects.get().value, -1)
+
+    def test_failed_flush_merges_votes_back(self):
+        self._vote(1)
+        self._flush_with_vote_during_write(fail=True)
+        self.assertFalse(Vote.objects.exists())
+        self.assertEqual(self.buffer.pending_count(), 1)
+        self.assertEqual(self._vote(-1), {'likes_count': 0, 'dislikes_count': 0})
+        self.assertEqual(self._vote(-1), {'likes_count': 0, 'dislikes_count': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.buffer.flush()
+        self.review.refresh_from_db()
+        self.assertEqual((self.review.likes_count, self.review.dislikes_count), (0, 1))
+
+    def test_unflushed_votes_survive_restart_through_journal(self):
+        self._vote(1)
+        with open(self.journal, 'a', encoding='utf-8') as journal:
+            journal.write('{"kind": "review", "tar')  # نوشتن نیمه‌کاره پیش از بسته شدن پروسس
+
+        restarted = VoteBuffer(self.journal)
+        self.assertEqual(restarted.overlay('review', self.user.pk, [self.review.pk], {}), {self.review.pk: 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            restarted.flush()
+            # بافر قبلی همان رأی را هنوز دارد؛ نوشتن دوباره آن چیزی را دو بار نمی‌شمارد
+            self.buffer.flush()
+        self.review.refresh_from_db()
+        self.assertEqual((self.review.likes_count, self.review.dislikes_count), (1, 0))
+        self.assertEqual(Vote.objects.get().value, 1)
+        self.assertEqual(os.path.getsize(self.journal), 0)
+
+
+class ProfessorDetailQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.professor = Professor.objects.create(name='دکتر رضایی')
+        self.client.force_login(self.user)
+
+    def _populate(self, count):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            author = User.objects.create_user(username=f'author{i}')
+            Review.objects.create(
+                professor=self.professor, user=author,
+                text='نظر آزمایشی درباره استاد', rating=3, is_approved=True
+            )
+            question = Question.objects.create(
+                professor=self.professor, user=author, text='پرسش آزمایشی', is_approved=True
+            )
+            Answer.objects.create(question=question, user=author, text='پاسخ آزمایشی', is_approved=True)
+            Answer.objects.create(question=question, user=self.user, text='پاسخ تأیید نشده')
+
+    def _assert_keyset_plan(self, queryset):
+        # صفحه اول و صفحه بعد از cursor هر دو بدون مرتب‌سازی موقت از ایندکس جزئی خوانده می‌شوند
+        for cursor in (None, (timezone.now(), 10 ** 6)):
+            plan = keyset_queryset(queryset, cursor)[:REVIEWS_PAGE_SIZE + 1].explain()
+            self.assertNotIn('TEMP B-TREE', plan)
+            self.assertIn('_approved_page_idx', plan)
+        # صفحه بعد از cursor یک جستجوی بازه‌ای روی created_at است
+        self.assertIn('created_at<', plan)
+
+    def test_review_pages_use_partial_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._populate(3)
+        self._assert_keyset_plan(
+            Review.objects.filter(professor=self.professor, is_approved=True).select_related('user')
+        )
+
+    def test_question_pages_use_partial_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._populate(3)
+        self._assert_keyset_plan(
+            Question.objects.filter(professor=self.professor, is_approved=True).select_related('user')
+        )
+
+    def test_query_count_is_independent_of_content_size(self):
+        url = reverse('reviews:professor_detail', args=[self.professor.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self._populate(2)
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        # بدنه صفحه از کش خوانده می‌شود
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._populate(10)
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertContains(response, 'نظر آزمایشی درباره استاد', count=10)
+
+    def test_votes_and_admin_actions_invalidate_cached_fragments(self):
+        url = reverse('reviews:professor_detail', args=[self.professor.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self._populate(1)
+        review = Review.objects.get()
+        self.assertContains(self.client.get(url), 'id="review-%d-likes">0<' % review.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('reviews:vote_review'), {'review_id': review.pk, 'value': 1})
+        self.assertContains(self.client.get(url), 'id="review-%d-likes">1<' % review.pk)
+
+        admin_user = User.objects.create_superuser('moderator', 'moderator@example.com', 'pass12345')
+        self.client.force_login(admin_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:reviews_review_changelist'), {
+                'action': 'reject_reviews', '_selected_action': [review.pk],
+            })
+        self.assertNotContains(self.client.get(url), 'id="review-%d-likes"' % review.pk)
+
+    def test_questions_fragment_is_paginated_with_constant_queries(self):
+        url = reverse('reviews:professor_questions_page', args=[self.professor.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self._populate(12)
+        # session، کاربر، استاد، پرسش‌ها، پاسخ‌ها و یک کوئری IN برای رأی‌های کاربر
+        with self.assertNumQueries(6):
+            data = self.client.get(url).json()
+        self.assertEqual(data['count'], QUESTIONS_PAGE_SIZE)
+        self.assertEqual(data['votes'], {})
+        self.assertEqual(data['html'].count('پاسخ آزمایشی'), QUESTIONS_PAGE_SIZE)
+        self.assertNotIn('پاسخ تأیید نشده', data['html'])
+        self.assertIn('name="question_id"', data['html'])
+
+        next_cursor = data['next_cursor']
+        answer = Answer.objects.filter(is_approved=True).order_by('pk').first()
+        self.client.post(reverse('reviews:vote_answer_ajax'), {'answer_id': answer.pk, 'value': -1})
+        data = self.client.get(url, {'cursor': next_cursor}).json()
+        self.assertEqual(data['count'], 2)
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(data['votes'], {str(answer.pk): -1})
+
+    def test_get_does_not_create_daily_limit_row(self):
+        self.client.get(reverse('reviews:professor_detail', args=[self.professor.pk]))
+        response = self.client.get(reverse('reviews:user_daily_stats'))
+        self.assertEqual(response.json()['review_remaining'], 3)
+        self.assertFalse(UserDailyLimit.objects.exists())
+
+
+class ProfessorPersonalStateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='hydrator', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.professor = Professor.objects.create(name='دکتر صادقی')
+            self.review = Review.objects.create(
+                professor=self.professor, user=self.user,
+                text='نظر تأیید شده درباره استاد', rating=5, is_approved=True
+            )
+        self.client.force_login(self.user)
+
+    def test_shell_is_shared_and_personal_state_is_separate(self):
+        url = reverse('reviews:professor_detail', args=[self.professor.pk])
+        self.client.get(url)
+        other = User.objects.create_user(username='other', password='pass12345')
+        self.client.force_login(other)
+        # بدنه ساخته شده برای کاربر قبلی بدون کوئری نظرات به کاربر دیگر داده می‌شود
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertIn('Cookie', response['Vary'])
+        self.assertIn('private', response['Cache-Control'])
+
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('reviews:vote_review'), {'review_id': self.review.pk, 'value': -1})
+            self.client.post(url, {
+                'form_type': 'review',
+                'text': 'نظر تازه‌ای که هنوز توسط مدیر تأیید نشده است',
+                'rating': 3,
+            })
+
+        response = self.client.get(reverse('reviews:professor_personal_state', args=[self.professor.pk]))
+        self.assertIn('no-store', response['Cache-Control'])
+        data = response.json()
+        self.assertEqual(data['review_limit']['remaining'], DAILY_REVIEW_LIMIT - 1)
+        self.assertEqual(data['review_votes'], {str(self.review.pk): -1})
+        self.assertEqual([item['kind'] for item in data['pending']], ['review'])
+        self.assertEqual([item['tags'] for item in data['messages']], ['success'])
+        self.assertTrue(data['csrf_token'])
+        # پیام‌ها یک بار تحویل داده می‌شوند
+        response = self.client.get(reverse('reviews:professor_personal_state', args=[self.professor.pk]))
+        self.assertEqual(response.json()['messages'], [])
+
+    def test_invalid_post_renders_prefilled_form(self):
+        url = reverse('reviews:professor_detail', args=[self.professor.pk])
+        response = self.client.post(url, {'form_type': 'review', 'text': 'متن کوتاه', 'rating': 'x'})
+        self.assertContains(response, 'لطفاً خطاهای فرم را اصلاح کنید.')
+        self.assertContains(response, 'متن کوتاه</textarea>')
+        # بدنه مشترک کش‌شده خطا و متن این کاربر را ندارد
+        self.assertNotContains(self.client.get(url), 'متن کوتاه')
+
+
+class DailyLimitConsumeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='poster', password='pass12345')
+        self.professor = Professor.objects.create(name='دکتر کریمی')
+        self.client.force_login(self.user)
+
+    def test_consume_stops_at_limit(self):
+        results = [UserDailyLimit.consume_review(self.user) for _ in range(DAILY_REVIEW_LIMIT + 1)]
+        self.assertEqual(results, [True] * DAILY_REVIEW_LIMIT + [False])
+        self.assertEqual(UserDailyLimit.get_today(self.user).review_count, DAILY_REVIEW_LIMIT)
+        self.assertTrue(UserDailyLimit.consume_question(self.user))
+
+    def test_post_review_consumes_quota(self):
+        url = reverse('reviews:professor_detail', args=[self.professor.pk])
+        for i in range(DAILY_REVIEW_LIMIT + 1):
+            self.client.post(url, {
+                'form_type': 'review',
+                'text': f'نظر شماره {i} درباره این استاد که به اندازه کافی طولانی است',
+                'rating': 4,
+            })
+        self.assertEqual(Review.objects.filter(user=self.user).count(), DAILY_REVIEW_LIMIT)
+        self.assertEqual(UserDailyLimit.get_today(self.user).review_count, DAILY_REVIEW_LIMIT)
+
+
+class FixLimitsCommandTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        professor = Professor.objects.create(name='دکتر کریمی')
+        self.today = timezone.localdate()
+        self.yesterday = self.today - datetime.timedelta(days=1)
+
+        def post(model, user, days_ago=0, **fields):
+            item = model.objects.create(professor=professor, user=user, text='متن آزمایشی', **fields)
+            model.objects.filter(pk=item.pk).update(created_at=timezone.now() - datetime.timedelta(days=days_ago))
+
+        post(Review, self.alice, rating=4)
+        post(Review, self.alice, rating=3)
+        post(Question, self.alice)
+        post(Review, self.alice, days_ago=1, rating=5)
+        post(Review, self.bob, rating=2)
+
+        # شمارنده‌های منحرف از داده واقعی
+        self.limits = {
+            (self.alice, self.today): UserDailyLimit.objects.create(user=self.alice, date=self.today, review_count=5),
+            (self.alice, self.yesterday): UserDailyLimit.objects.create(user=self.alice, date=self.yesterday, question_count=3),
+            (self.bob, self.today): UserDailyLimit.objects.create(user=self.bob, date=self.today, review_count=9, question_count=9),
+        }
+
+    def _counts(self):
+        counts = {}
+        for key, daily_limit in self.limits.items():
+            daily_limit.refresh_from_db()
+            counts[key] = (daily_limit.review_count, daily_limit.question_count)
+        return counts
+
+    def test_dry_run_reports_without_writing(self):
+        before = self._counts()
+        output = StringIO()
+        call_command('fix_limits', '--dry-run', stdout=output)
+        self.assertEqual(self._counts(), before)
+        self.assertIn('3 از 3', output.getvalue())
+
+    def test_counts_are_recomputed_in_batches(self):
+        call_command('fix_limits', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(self._counts(), {
+            (self.alice, self.today): (2, 1),
+            (self.alice, self.yesterday): (1, 0),
+            (self.bob, self.today): (1, 0),
+        })
+
+    def test_user_and_since_limit_the_rows_fixed(self):
+        call_command('fix_limits', '--user', 'alice', '--since', self.today.isoformat(), stdout=StringIO())
+        self.assertEqual(self._counts(), {
+            (self.alice, self.today): (2, 1),
+            (self.alice, self.yesterday): (0, 3),
+            (self.bob, self.today): (9, 9),
+        })
+
+    def test_posts_near_midnight_count_on_the_site_day(self):
+        carol = User.objects.create_user(username='carol')
+        # ۲۱:۰۰ UTC همان ۰۰:۳۰ روز بعد در تهران است
+        question = Question.objects.create(professor=Professor.objects.first(), user=carol, text='متن آزمایشی')
+        Question.objects.filter(pk=question.pk).update(
+            created_at=datetime.datetime(2026, 3, 1, 21, 0, tzinfo=datetime.timezone.utc)
+        )
+        before = UserDailyLimit.objects.create(user=carol, date=datetime.date(2026, 3, 1), question_count=1)
+        after = UserDailyLimit.objects.create(user=carol, date=datetime.date(2026, 3, 2))
+
+        call_command('fix_limits', '--user', 'carol', '--since', '2026-03-02', stdout=StringIO())
+        before.refresh_from_db()
+        after.refresh_from_db()
+        self.assertEqual((before.question_count, after.question_count), (1, 1))
+
+    def test_invalid_options_are_rejected(self):
+        with self.assertRaises(CommandError):
+            call_command('fix_limits', '--user', 'nobody', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('fix_limits', '--batch-size', '0', stdout=StringIO())
+
+
+class BatchedDeleteCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='batcher', password='pass12345')
+        self.professor = Professor.objects.create(name='دکتر حسینی')
+        self.other = Professor.objects.create(name='دکتر موسوی')
+
+    def test_cascade_delete_applies_counters_once_on_commit(self):
+        for professor in (self.professor, self.professor, self.other):
+            UserDailyLimit.consume_review(self.user)
+            Review.objects.create(
+                professor=professor, user=self.user,
+                text='نظر آزمایشی درباره استاد', rating=5, is_approved=True
+            )
+        UserDailyLimit.consume_question(self.user)
+        Question.objects.create(professor=self.professor, user=self.user, text='پرسش آزمایشی')
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.professor.delete()
+        counter_flushes = [func for func in callbacks if getattr(func, 'batch', None).__class__ is DeleteCounterBatch]
+        self.assertEqual(len(counter_flushes), 1)
+
+        daily_limit = UserDailyLimit.get_today(self.user)
+        self.assertEqual((daily_limit.review_count, daily_limit.question_count), (1, 0))
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.review_count, 1)
+
+    def test_batch_of_rolled_back_savepoint_is_not_reused(self):
+        batch = DeleteCounterBatch.current()
+        self.assertIs(DeleteCounterBatch.current(), batch)
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                stale = DeleteCounterBatch.current()
+                self.assertIs(stale, batch)
+                raise DatabaseError
+        # callback بیرونی هنوز در صف است
+        self.assertIs(DeleteCounterBatch.current(), batch)
+
+        batch.flush()
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                stale = DeleteCounterBatch.current()
+                raise DatabaseError
+        self.assertFalse(stale.is_pending())
+        self.assertIsNot(DeleteCounterBatch.current(), stale)
+
+    def test_delete_near_midnight_decrements_the_site_day_row(self):
+        # ۲۱:۰۰ UTC همان ۰۰:۳۰ روز بعد در تهران است
+        late = datetime.datetime(2026, 3, 1, 21, 0, tzinfo=datetime.timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=late):
+            UserDailyLimit.consume_review(self.user)
+            with self.captureOnCommitCallbacks(execute=True):
+                review = Review.objects.create(
+                    professor=self.professor, user=self.user,
+                    text='نظر آزمایشی درباره استاد', rating=5, is_approved=True
+                )
+            self.assertEqual(UserDailyLimit.get_today(self.user).review_count, 1)
+            with self.captureOnCommitCallbacks(execute=True):
+                review.delete()
+        daily_limit = UserDailyLimit.objects.get(user=self.user)
+        self.assertEqual((daily_limit.date, daily_limit.review_count), (datetime.date(2026, 3, 2), 0))
+
+    def test_target_delete_removes_votes_without_per_vote_signals(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            review = Review.objects.create(
+                professor=self.professor, user=self.user,
+                text='نظر آزمایشی درباره استاد', rating=5, is_approved=True
+            )
+            Vote.objects.create(target_type='review', target_id=review.pk, user=self.user, value=1)
+            Vote.objects.create(target_type='answer', target_id=review.pk, user=self.user, value=1)
+
+        deleted_votes = []
+        receiver = lambda sender, instance, **kwargs: deleted_votes.append(instance)
+        post_delete.connect(receiver, sender=Vote)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Vote)
+        with self.captureOnCommitCallbacks(execute=True):
+            review.delete()
+        self.assertEqual(deleted_votes, [])
+        self.assertEqual(list(Vote.objects.values_list('target_type', flat=True)), ['answer'])
+
+
+class ProfessorSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ahmadi = Professor.objects.create(name='دکتر احمدی', department='مهندسی کامپیوتر')
+            self.karimi = Professor.objects.create(name='دکتر کریمی', department='فیزیک', bio='متخصص مکانیک کوانتومی')
+
+    def _names(self, query):
+        return [professor.name for professor in find_professors(query)]
+
+    def test_prefix_match_on_name_department_and_bio(self):
+        self.assertEqual(self._names('احم'), ['دکتر احمدی'])
+        self.assertEqual(self._names('کامپ'), ['دکتر احمدی'])
+        self.assertEqual(self._names('کوانتوم'), ['دکتر کریمی'])
+        self.assertEqual(self._names('"'), [])
+
+    def test_home_search_loads_only_the_current_page_and_keeps_department(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(HOME_PAGE_SIZE + 2):
+                Professor.objects.create(name=f'دکتر شماره {i}', department='فیزیک')
+        physics = self.karimi.canonical_department_id
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('reviews:home'), {'query': 'دکتر', 'page': 2})
+        self.assertEqual(response.context['page'].paginator.count, HOME_PAGE_SIZE + 4)
+        self.assertEqual(len(response.context['professors']), 4)
+        # CASE ترتیب فقط برای شناسه‌های همین صفحه ساخته می‌شود
+        self.assertTrue(all(query['sql'].count('WHEN') <= HOME_PAGE_SIZE for query in queries.captured_queries))
+
+        response = self.client.get(reverse('reviews:home'), {'query': 'دکتر', 'department': physics})
+        self.assertEqual(response.context['page'].paginator.count, HOME_PAGE_SIZE + 3)
+        self.assertNotIn(self.ahmadi, response.context['professors'])
+
+    def test_only_approved_review_text_is_indexed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            review = Review.objects.create(
+                professor=self.karimi, user=self.user,
+                text='تمرین‌های هفتگی بسیار مفید', rating=5
+            )
+        self.assertEqual(self._names('هفتگی'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review.is_approved = True
+            review.save()
+        self.assertEqual(self._names('هفتگی'), ['دکتر کریمی'])
+
+    def test_arabic_letters_zwnj_and_digits_are_folded(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Professor.objects.create(name='دکتر علی‌رضا کاظمی', department='ریاضی ۲')
+        self.assertEqual(self._names('علیرضا كاظمي'), ['دکتر علی‌رضا کاظمی'])
+        self.assertEqual(self._names('رياضي 2'), ['دکتر علی‌رضا کاظمی'])
+        self.assertEqual(self._names('کريمي'), ['دکتر کریمی'])
+
+    def test_name_match_ranks_above_bio_match(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Professor.objects.create(name='دکتر فیزیکدان', bio='')
+        self.assertEqual(self._names('فیزیک')[0], 'دکتر فیزیکدان')
+
+    def test_missing_fts_table_is_cached_until_recheck_or_migrate(self):
+        reset_fts_available()
+        self.addCleanup(reset_fts_available)
+        now = [1000.0]
+        with mock.patch('reviews.search.time.monotonic', lambda: now[0]), \
+                mock.patch.object(connection.introspection, 'table_names', return_value=[]) as table_names:
+            self.assertFalse(fts_available())
+            self.assertEqual(self._names('احم'), ['دکتر احمدی'])
+            self.assertEqual(table_names.call_count, 1)
+
+            now[0] += FTS_RECHECK_INTERVAL + 1
+            self.assertFalse(fts_available())
+            self.assertEqual(table_names.call_count, 2)
+
+            reviews_app = apps.get_app_config('reviews')
+            post_migrate.send(sender=reviews_app, app_config=reviews_app, verbosity=0, interactive=False, using='default')
+            self.assertFalse(fts_available())
+            self.assertEqual(table_names.call_count, 3)
+
+
+class PrefixIndexTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ahmadi = Professor.objects.create(name='دکتر احمدی', department='مهندسی برق')
+            self.ahmadian = Professor.objects.create(name='دکتر احمدیان', department='ریاضی')
+            self.bagheri = Professor.objects.create(name='دکتر باقری', department='مهندسی کامپیوتر')
+
+    def test_word_prefix_lookup(self):
+        self.assertEqual(professor_prefix_index.lookup('احمد', 10), [self.ahmadi.pk, self.ahmadian.pk])
+        self.assertEqual(professor_prefix_index.lookup('دکتر باق', 10), [self.bagheri.pk])
+        self.assertEqual(professor_prefix_index.lookup('مهندسی', 10), [self.ahmadi.pk, self.bagheri.pk])
+        self.assertEqual(professor_prefix_index.lookup('احمد', 1), [self.ahmadi.pk])
+
+    def test_index_refreshes_after_professor_change(self):
+        professor_prefix_index.lookup('احمد', 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ahmadi.delete()
+        self.assertEqual(professor_prefix_index.lookup('احمد', 10), [self.ahmadian.pk])
+
+    def test_live_search_echoes_query(self):
+        response = self.client.get(reverse('reviews:live_search'), {'query': 'باقر'})
+        data = response.json()
+        self.assertEqual((data['query'], data['count']), ('باقر', 1))
+        self.assertIn('دکتر باقری', data['html'])
+
+
+class TrigramSuggestionTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mohammadi = Professor.objects.create(name='دکتر محمدی', department='شیمی')
+            Professor.objects.create(name='دکتر صادقی', department='زیست‌شناسی')
+
+    def test_similar_ranks_misspelled_name(self):
+        matches = professor_trigram_index.similar('محمودی', 5)
+        self.assertEqual(matches[0][0], self.mohammadi.pk)
+        self.assertEqual(professor_trigram_index.similar('کاملا متفاوت', 5), [])
+
+    def test_home_shows_did_you_mean_when_exact_search_misses(self):
+        response = self.client.get(reverse('reviews:home'), {'query': 'محمودی'})
+        self.assertEqual(response.context['suggestion'], 'دکتر محمدی')
+        self.assertEqual([p.pk for p in response.context['professors']], [self.mohammadi.pk])
+
+
+class TransliterationSearchTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ahmadi = Professor.objects.create(name='دکتر علی احمدی', department='ریاضی')
+            self.mohammadi = Professor.objects.create(name='دکتر محمدی', department='شیمی')
+
+    def test_key_is_computed_on_save(self):
+        self.assertEqual(self.ahmadi.search_latin, 'hmd l')
+        self.ahmadi.name = 'دکتر رضا احمدی'
+        self.ahmadi.save(update_fields=['name'])
+        self.ahmadi.refresh_from_db()
+        self.assertEqual(self.ahmadi.search_latin, 'hmd rz')
+
+    def test_latin_queries_match_persian_names(self):
+        for query in ('ahmadi', 'Ahmadi', 'ali ahmadi', 'ahmadi ali', 'ahm'):
+            self.assertEqual(list(find_professors(query)), [self.ahmadi], query)
+        self.assertEqual(list(find_professors('mohamadi')), [self.mohammadi])
+        self.assertEqual(list(find_professors('sadeghi')), [])
+
+    def test_latin_prefix_lookup_uses_index(self):
+        plan = find_professors_by_transliteration('ali ahmadi').explain()
+        self.assertNotIn('SCAN reviews_professor', plan)
+        self.assertIn('search_latin', plan)
+
+
+class ReviewPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.professor = Professor.objects.create(name='دکتر کریمی')
+        author = User.objects.create_user(username='paged-author')
+        self.client.force_login(author)
+        # زمان ایجاد یکسان برای آزمودن ترتیب ثانویه روی id
+        created_at = timezone.now()
+        for i in range(25):
+            review = Review.objects.create(
+                professor=self.professor, user=author,
+                text=f'نظر شماره {i}', rating=4, is_approved=True
+            )
+            Review.objects.filter(pk=review.pk).update(created_at=created_at - datetime.timedelta(minutes=i // 2))
+
+    def test_pages_cover_every_review_once_in_order(self):
+        expected = list(Review.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+        response = self.client.get(reverse('reviews:professor_detail', args=[self.professor.pk]))
+        first_page, cursor = review_page(self.professor)
+        self.assertEqual(response.context['reviews_fragment']['next_cursor'], cursor)
+        seen = [review.pk for review in first_page]
+
+        url = reverse('reviews:professor_reviews_page', args=[self.professor.pk])
+        while cursor:
+            data = self.client.get(url, {'cursor': cursor}).json()
+            reviews, next_cursor = review_page(self.professor, decode_cursor(cursor))
+            self.assertEqual(data['count'], len(reviews))
+            self.assertEqual(data['next_cursor'], next_cursor)
+            seen.extend(review.pk for review in reviews)
+            cursor = next_cursor
+        self.assertEqual(seen, expected)
+
+    def test_cursor_round_trip(self):
+        review = Review.objects.first()
+        self.assertEqual(decode_cursor(encode_cursor(review)), (review.created_at, review.pk))
+
+    def test_invalid_cursor_is_rejected(self):
+        url = reverse('reviews:professor_reviews_page', args=[self.professor.pk])
+        self.assertEqual(self.client.get(url, {'cursor': 'abc'}).status_code, 400)
+
+
+class DepartmentFacetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='facet-user', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first = Professor.objects.create(name='دکتر الف', department='ریاضی')
+            Professor.objects.create(name='دکتر ب', department='ریاضی')
+            Professor.objects.create(name='دکتر ج', department='فیزیک')
+            Professor.objects.create(name='دکتر د')
+
+    def test_facets_are_cached_and_invalidated(self):
+        self.assertEqual(
+            [(f['department'], f['count'], f['average_rating']) for f in department_facets()],
+            [('ریاضی', 2, None), ('فیزیک', 1, None)]
+        )
+        with self.assertNumQueries(0):
+            department_facets()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(professor=self.first, user=self.user, text='نظر آزمایشی درباره استاد', rating=4, is_approved=True)
+            Professor.objects.create(name='دکتر ه', department='فیزیک')
+        self.assertEqual(
+            [(f['department'], f['count'], f['average_rating']) for f in department_facets()],
+            [('ریاضی', 2, 4.0), ('فیزیک', 2, None)]
+        )
+
+    def test_home_filters_by_department(self):
+        physics = Department.objects.get(name='فیزیک')
+        response = self.client.get(reverse('reviews:home'), {'department': physics.pk})
+        self.assertEqual([p.name for p in response.context['professors']], ['دکتر ج'])
+        self.assertContains(response, 'ریاضی (2)')
+
+    def test_department_listing_uses_an_index_for_every_sort(self):
+        physics = Department.objects.get(name='فیزیک')
+        professors = Professor.objects.filter(canonical_department=physics)
+        values = {'name': 'دکتر', 'rating_average': 3.0, 'review_count': 2, 'last_review_at': timezone.now()}
+        for sort, (label, keys) in HOME_SORTS.items():
+            for page_cursor in (None, (values[keys[0][0]], 1)):
+                plan = keyset_queryset(professors, page_cursor, keys)[:HOME_PAGE_SIZE + 1].explain()
+                self.assertNotIn('TEMP B-TREE', plan, sort)
+                self.assertIn('professor_dept_', plan, sort)
+            # صفحه بعد از همان نقطه ایندکس شروع می‌شود، نه با OFFSET یا پیمایش از ابتدا
+            self.assertRegex(plan, rf'{keys[0][0]}[<>]', sort)
+
+    def test_out_of_range_department_is_ignored(self):
+        for department in ('100000000000000000000', '0'):
+            response = self.client.get(reverse('reviews:home'), {'department': department})
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response.context['department'])
+            self.assertEqual(len(response.context['professors']), 4)
+
+
+class DepartmentModelTests(TestCase):
+    def test_spellings_share_one_department_with_rollups(self):
+        user = User.objects.create_user(username='dept-user')
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Professor.objects.create(name='دکتر الف', department='مهندسی کامپیوتر')
+            second = Professor.objects.create(name='دکتر ب', department='كامپيوتر')
+            Review.objects.create(professor=first, user=user, text='نظر آزمایشی درباره استاد', rating=5, is_approved=True)
+            Review.objects.create(professor=second, user=user, text='نظر آزمایشی درباره استاد', rating=2, is_approved=True)
+
+        department = Department.objects.get()
+        self.assertEqual(second.canonical_department, department)
+        self.assertEqual(department.name, 'مهندسی کامپیوتر')
+        self.assertEqual((department.professor_count, department.review_count), (2, 2))
+        self.assertEqual(department.average_rating, 3.5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.department = 'ریاضی'
+            second.save(update_fields=['department'])
+        department.refresh_from_db()
+        self.assertEqual((department.professor_count, department.review_count), (1, 1))
+        self.assertEqual(Department.objects.get(key='ریاضی').professor_count, 1)
+
+
+class DepartmentKeyTests(TestCase):
+    def test_engineering_departments_stay_separate_from_sciences(self):
+        for engineering, science in (('مهندسی شیمی', 'شیمی'), ('مهندسی پزشکی', 'پزشکی')):
+            self.assertNotEqual(department_key(engineering), department_key(science))
+
+    def test_organisational_prefixes_and_aliases_share_a_key(self):
+        self.assertEqual(department_key('دانشکده فیزیک'), department_key('فیزیک'))
+        self.assertEqual(department_key('گروه آموزشی ریاضی'), department_key('ریاضی'))
+        self.assertEqual(department_key('كامپيوتر'), department_key('دانشکده مهندسی کامپیوتر'))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='revalidator', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.professor = Professor.objects.create(name='دکتر نوری')
+            self.review = Review.objects.create(
+                professor=self.professor, user=self.user,
+                text='نظر آزمایشی درباره استاد', rating=4, is_approved=True
+            )
+        self.client.force_login(self.user)
+
+    def test_professor_page_revalidates_until_content_changes(self):
+        url = reverse('reviews:professor_detail', args=[self.professor.pk])
+        etag = self.client.get(url)['ETag']
+        # session، کاربر و نسخه استاد؛ بدون کوئری نظرات و سهمیه
+        with self.assertNumQueries(3):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('reviews:vote_review'), {'review_id': self.review.pk, 'value': 1})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_professor_page_etag_changes_with_the_csrf_token(self):
+        url = reverse('reviews:professor_detail', args=[self.professor.pk])
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        # ورود دوباره token را عوض می‌کند؛ صفحه قدیمی فرم خروج با token باطل دارد
+        self.client.logout()
+        self.client.force_login(self.user)
+        self.client.get(reverse('reviews:home'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_fragment_and_json_endpoints_return_304(self):
+        url = reverse('reviews:professor_questions_page', args=[self.professor.pk])
+        response = self.client.get(url)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+        )
+
+        url = reverse('reviews:user_daily_stats')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
 
-# Create your tests here.
+        url = reverse('reviews:live_search')
+        etag = self.client.get(url, {'query': 'نوری'})['ETag']
+        self.assertEqual(self.client.get(url, {'query': 'نوری'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # ETag یک جستجو برای جستجوی دیگر معتبر نیست
+        self.assertEqual(self.client.get(url, {'query': 'نور'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            Professor.objects.create(name='دکتر نوروزی')
+        self.assertEqual(self.client.get(url, {'query': 'نوری'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
@@ -7,8 +7,12 @@ app_name = 'reviews'
 urlpatterns = [
     path('', views.home, name='home'),
     path('professor/<int:pk>/', views.professor_detail, name='professor_detail'),
+    path('professor/<int:pk>/reviews/', views.professor_reviews_page, name='professor_reviews_page'),
+    path('professor/<int:pk>/questions/', views.professor_questions_page, name='professor_questions_page'),
+    path('professor/<int:pk>/me/', views.professor_personal_state, name='professor_personal_state'),
     path('vote-review/', views.vote_review, name='vote_review'),
     path('vote-answer/', views.vote_answer_ajax, name='vote_answer_ajax'),
+    path('vote-batch/', views.vote_batch, name='vote_batch'),
     path('live-search/', views.live_search_professors, name='live_search'),
     path('daily-stats/', views.user_daily_stats, name='user_daily_stats'),
     
@@ -2,42 +2,365 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Count
-from django.http import JsonResponse
+from django.db import transaction
+from django.db.models import Count, F, Max, Prefetch, Q, prefetch_related_objects
+from django.http import Http404, JsonResponse
 from django.template.loader import render_to_string
+from django.views.decorators.cache import cache_control, never_cache
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+from django.middleware.csrf import get_token
 from django.contrib import messages
+from django.core.cache import cache
+from django.core.paginator import Paginator
 from django.utils import timezone
 import datetime
+import hashlib
+import json
 
-from .models import Professor, Review, Question, Answer, AnswerVote, ReviewVote, UserDailyLimit
+from .models import Professor, Review, Question, Answer, UserDailyLimit
+from .caching import cached_fragment
 from .forms import ReviewForm, QuestionForm, AnswerForm, SignUpForm, ProfessorSearchForm, LoginForm
+from .search import PROFESSOR_INDEX_VERSION_KEY, department_facets, find_professor_ids, find_professors, find_similar_professors, professor_prefix_index, professors_in_order
+from .voting import VOTE_BATCH_LIMIT, VOTE_KINDS, VOTE_VALUES, apply_votes, toggle_vote, user_votes
 
 # =========================
 # ثابت‌های سیستم
 # =========================
 DAILY_REVIEW_LIMIT = 3  # تغییر از ۴ به ۳
 DAILY_QUESTION_LIMIT = 3  # تغییر از ۴ به ۳
+LIVE_SEARCH_LIMIT = 20  # حداکثر نتایج جستجوی زنده
+REVIEWS_PAGE_SIZE = 10  # تعداد نظرات در هر صفحه صفحه استاد
+QUESTIONS_PAGE_SIZE = 10  # تعداد پرسش‌ها در هر صفحه تب پرسش و پاسخ
+HOME_PAGE_SIZE = 24  # تعداد اساتید در هر صفحه لیست اصلی
+PENDING_SUBMISSIONS_LIMIT = 10  # حداکثر ارسال‌های در انتظار تأیید در بخش شخصی صفحه استاد
+
+# حالت‌های مرتب‌سازی صفحه اصلی: (عنوان، کلیدهای keyset)؛ هر ترتیب با یکی از ایندکس‌های Professor هم‌خوان است
+HOME_SORTS = {
+    'name': ('نام', (('name', False), ('id', False))),
+    'rating': ('بیشترین امتیاز', (('rating_average', True), ('id', False))),
+    'reviews': ('بیشترین نظر', (('review_count', True), ('id', False))),
+    'recent': ('فعالیت اخیر', (('last_review_at', True), ('id', False))),
+}
+DEFAULT_HOME_SORT = 'name'
+
+# کلیدهای keyset نظرات و پرسش‌ها: جدیدترین اول
+CREATED_AT_KEYS = (('created_at', True), ('id', True))
 
 # =========================
 # Helper Functions
 # =========================
-def check_daily_limit(user, limit_type):
-    """بررسی محدودیت روزانه کاربر"""
+def consume_daily_limit(user, limit_type):
+    """
+    مصرف اتمیک یک واحد از سهمیه روزانه کاربر.
+    باید داخل همان تراکنشی صدا زده شود که نظر یا پرسش را ذخیره می‌کند
+    تا در صورت شکست ثبت، سهمیه هم برگردد.
+    """
+    if limit_type == 'review':
+        if not UserDailyLimit.consume_review(user):
+            return False, f"شما امروز {DAILY_REVIEW_LIMIT} نظر ارسال کرده‌اید. فردا مجدد تلاش کنید."
+        return True, "مجاز"
+
+    elif limit_type == 'question':
+        if not UserDailyLimit.consume_question(user):
+            return False, f"شما امروز {DAILY_QUESTION_LIMIT} پرسش ارسال کرده‌اید. فردا مجدد تلاش کنید."
+        return True, "مجاز"
+
+
+_CURSOR_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def encode_cursor(obj):
+    """cursor صفحه بعد: زمان ایجاد (به میکروثانیه) و شناسه آخرین ردیف صفحه"""
+    delta = obj.created_at - _CURSOR_EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return f'{microseconds}_{obj.pk}'
+
+
+def decode_cursor(cursor):
+    """خروجی (created_at, id) یا None اگر cursor نامعتبر باشد"""
     try:
-        daily_limit = UserDailyLimit.get_or_create_today(user)
-        
-        if limit_type == 'review':
-            if not daily_limit.can_post_review:
-                return False, f"شما امروز {DAILY_REVIEW_LIMIT} نظر ارسال کرده‌اید. فردا مجدد تلاش کنید."
-            return True, "مجاز"
-        
-        elif limit_type == 'question':
-            if not daily_limit.can_post_question:
-                return False, f"شما امروز {DAILY_QUESTION_LIMIT} پرسش ارسال کرده‌اید. فردا مجدد تلاش کنید."
-            return True, "مجاز"
-        
-    except Exception as e:
-        return True, "خطا در بررسی محدودیت"
+        microseconds, pk = (int(part) for part in cursor.split('_'))
+    except (AttributeError, ValueError):
+        return None
+    return _CURSOR_EPOCH + datetime.timedelta(microseconds=microseconds), pk
+
+
+def parse_id(value):
+    """شناسه مثبت از پارامتر URL، یا None اگر عدد نباشد یا در بازه INTEGER دیتابیس نگنجد"""
+    value = int(value) if value and value.isdigit() else None
+    return value if value is not None and 0 < value < 2 ** 63 else None
+
+
+def _keyset_ordering(model, keys):
+    # ستون nullable نزولی: NULL آخر، هم‌جهت با ایندکس
+    return [
+        F(field).desc(nulls_last=True) if descending and model._meta.get_field(field).null
+        else f'-{field}' if descending else field
+        for field, descending in keys
+    ]
+
+
+def _keyset_after(keys, values):
+    """
+    شرط «بعد از values» در ترتیب keys. کلید اول با نابرابری غیراکید هم محدود می‌شود
+    تا SQLite جستجو را از همان نقطه ایندکس شروع کند؛ با OR تنها کل ایندکس پیموده می‌شود.
+    """
+    (field, descending), value = keys[0], values[0]
+    if value is None:
+        # NULL آخرین مقدار ترتیب نزولی است؛ بعد از آن فقط NULLهای دیگر
+        return Q(**{f'{field}__isnull': True}) & _keyset_after(keys[1:], values[1:])
+    strict = 'lt' if descending else 'gt'
+    if len(keys) == 1:
+        return Q(**{f'{field}__{strict}': value})
+    return Q(**{f'{field}__{strict}e': value}) & (
+        Q(**{f'{field}__{strict}': value}) | _keyset_after(keys[1:], values[1:])
+    )
+
+
+def keyset_queryset(queryset, cursor=None, keys=CREATED_AT_KEYS):
+    """
+    queryset مرتب‌شده روی keys ([(فیلد، نزولی؟)] که آخرین آن یکتاست) و محدود به ردیف‌های
+    بعد از cursor (مقدار همان فیلدها در آخرین ردیف صفحه قبل). cursor غیر NULL یک ستون
+    nullable ردیف‌های NULL انتهای ترتیب را شامل نمی‌شود (home_page آن‌ها را جدا می‌خواند).
+    """
+    queryset = queryset.order_by(*_keyset_ordering(queryset.model, keys))
+    if cursor is not None:
+        queryset = queryset.filter(_keyset_after(keys, cursor))
+    return queryset
+
+
+def keyset_page(queryset, cursor=None, page_size=REVIEWS_PAGE_SIZE):
+    """
+    یک صفحه از queryset با صفحه‌بندی keyset روی (created_at, id) نزولی.
+    به جای OFFSET از آخرین ردیف صفحه قبل ادامه می‌دهد، پس هزینه هر صفحه
+    (با ایندکس مرکب مدل) مستقل از شماره صفحه است.
+    خروجی: (لیست ردیف‌ها، cursor صفحه بعد یا None)
+    """
+    # یک ردیف اضافه فقط برای فهمیدن وجود صفحه بعد
+    page = list(keyset_queryset(queryset, cursor)[:page_size + 1])
+    if len(page) <= page_size:
+        return page, None
+    page = page[:page_size]
+    return page, encode_cursor(page[-1])
+
+
+def home_page(queryset, keys, after=None):
+    """
+    یک صفحه اساتید به ترتیب keys، بعد از استاد با شناسه after (صفحه اول اگر None
+    یا استاد وجود نداشته باشد). هر صفحه یک جستجوی بازه‌ای روی ایندکس است، نه OFFSET.
+    خروجی: (لیست اساتید، شناسه آخرین استاد برای صفحه بعد یا None)
+    """
+    cursor = None
+    if after is not None:
+        cursor = Professor.objects.filter(pk=after).values_list(*[field for field, descending in keys]).first()
+    page = list(keyset_queryset(queryset, cursor, keys)[:HOME_PAGE_SIZE + 1])
+
+    field = keys[0][0]
+    if len(page) <= HOME_PAGE_SIZE and cursor and cursor[0] is not None and Professor._meta.get_field(field).null:
+        # بعد از آخرین مقدار غیر NULL نوبت ردیف‌های NULL است (مثلاً اساتید بدون نظر در «فعالیت اخیر»)
+        nulls = keyset_queryset(queryset.filter(**{f'{field}__isnull': True}), None, keys)
+        page += nulls[:HOME_PAGE_SIZE + 1 - len(page)]
+    if len(page) <= HOME_PAGE_SIZE:
+        return page, None
+    return page[:HOME_PAGE_SIZE], page[HOME_PAGE_SIZE - 1].pk
+
+
+def review_page(professor, cursor=None):
+    """یک صفحه از نظرات تأیید شده استاد"""
+    reviews = Review.objects.filter(
+        professor=professor,
+        is_approved=True
+    ).select_related('user')
+    return keyset_page(reviews, cursor, REVIEWS_PAGE_SIZE)
+
+
+def question_page(professor, cursor=None):
+    """یک صفحه از پرسش‌های تأیید شده استاد همراه با پاسخ‌های تأیید شده (یک کوئری prefetch)"""
+    approved_answers = Answer.objects.filter(
+        is_approved=True
+    ).select_related('user').order_by('created_at')
+
+    questions = Question.objects.filter(
+        professor=professor,
+        is_approved=True
+    ).select_related('user')
+    page, next_cursor = keyset_page(questions, cursor, QUESTIONS_PAGE_SIZE)
+    # prefetch بعد از برش تا پاسخ‌های ردیف اضافه (بررسی صفحه بعد) خوانده نشوند
+    prefetch_related_objects(page, Prefetch('answers', queryset=approved_answers, to_attr='answers_approved'))
+    return page, next_cursor
+
+
+def review_fragment(professor, cursor=None):
+    """
+    یک صفحه نظرات به صورت قطعه عمومی کش‌شده: {'html', 'count', 'next_cursor', 'vote_ids'}.
+    بدون request رندر می‌شود تا هیچ داده شخصی‌ای وارد کش نشود؛ vote_ids شناسه
+    نظرات صفحه است تا رأی‌های کاربر با یک کوئری IN جداگانه خوانده شود.
+    """
+    def build():
+        reviews, next_cursor = review_page(professor, cursor)
+        html = render_to_string('reviews/partials/review_list.html', {'reviews': reviews})
+        return {
+            'html': html, 'count': len(reviews), 'next_cursor': next_cursor,
+            'vote_ids': [review.pk for review in reviews],
+        }
+    return cached_fragment(professor, f'reviews:{_cursor_name(cursor)}', build)
+
+
+def question_fragment(professor, cursor=None):
+    """
+    یک صفحه پرسش و پاسخ به صورت قطعه عمومی کش‌شده: {'html', 'count', 'next_cursor', 'vote_ids'}.
+    فرم‌های پاسخ بدون CSRF token رندر می‌شوند و کلاینت token را هنگام درج اضافه می‌کند؛
+    vote_ids شناسه پاسخ‌های نمایش داده شده است.
+    """
+    def build():
+        questions, next_cursor = question_page(professor, cursor)
+        html = render_to_string(
+            'reviews/partials/question_list.html',
+            {'professor': professor, 'questions': questions, 'answer_form': AnswerForm()}
+        )
+        return {
+            'html': html, 'count': len(questions), 'next_cursor': next_cursor,
+            'vote_ids': [answer.pk for question in questions for answer in question.answers_approved],
+        }
+    return cached_fragment(professor, f'questions:{_cursor_name(cursor)}', build)
+
+
+def professor_shell_context(professor, **extra):
+    """context بدنه صفحه استاد؛ extra برای فرم‌های پرشده و خطای پاسخ POST نامعتبر"""
+    context = {
+        'professor': professor,
+        'reviews_fragment': review_fragment(professor),
+        'review_form': ReviewForm(),
+        'question_form': QuestionForm(),
+        'answer_form': AnswerForm(),
+        'DAILY_REVIEW_LIMIT': DAILY_REVIEW_LIMIT,
+        'DAILY_QUESTION_LIMIT': DAILY_QUESTION_LIMIT,
+    }
+    context.update(extra)
+    return context
+
+
+def professor_shell(professor):
+    """
+    بدنه صفحه استاد به صورت قطعه عمومی کش‌شده (HTML).
+    سهمیه، رأی‌ها، ارسال‌های در انتظار و پیام‌های کاربر در آن نیستند و کلاینت
+    آن‌ها را از professor_personal_state می‌گیرد؛ فرم‌ها بدون CSRF token هستند.
+    """
+    return cached_fragment(professor, 'shell', lambda: render_to_string(
+        'reviews/partials/professor_shell.html', professor_shell_context(professor)
+    ))
+
+
+def _cursor_name(cursor):
+    if cursor is None:
+        return 'first'
+    created_at, pk = cursor
+    return f'{created_at.timestamp():.6f}_{pk}'
+
+
+# =========================
+# Conditional GET (ETag / Last-Modified)
+# =========================
+# توابع اعتبارسنج قبل از view و فقط با یک کوئری سبک اجرا می‌شوند تا پاسخ
+# 304 پیش از کوئری‌های اصلی و رندر قالب برگردد.
+def request_professor(request, pk):
+    """
+    استاد درخواست جاری؛ یک بار خوانده و روی request نگه داشته می‌شود تا
+    اعتبارسنج‌ها و خود view کوئری تکراری نزنند. None اگر وجود نداشته باشد.
+    """
+    cached = getattr(request, '_professor', None)
+    if cached is None or cached[0] != pk:
+        cached = (pk, Professor.objects.filter(pk=pk).first())
+        request._professor = cached
+    return cached[1]
+
+
+def request_daily_limit(request):
+    """سهمیه امروز کاربر درخواست جاری (یک بار برای هر درخواست)"""
+    if not hasattr(request, '_daily_limit'):
+        request._daily_limit = UserDailyLimit.get_today(request.user)
+    return request._daily_limit
+
+
+def professor_detail_etag(request, pk):
+    """
+    بدنه صفحه استاد بین کاربران مشترک است و بخش‌های شخصی از
+    professor_personal_state می‌آیند، پس سهمیه و پیام‌ها در ETag نیستند.
+    کاربر و CSRF token فقط به خاطر نوار بالای base.html (نام کاربر و فرم خروج)
+    در ETag می‌مانند؛ token با هر ورود عوض می‌شود و فرم خروج با token قدیمی 403 می‌گیرد.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    professor = request_professor(request, pk)
+    if professor is None:
+        return None
+    # get_token در اولین بازدید secret را می‌سازد تا ETag همان token صفحه را پوشش دهد
+    get_token(request)
+    csrf_hash = hashlib.sha1(request.META['CSRF_COOKIE'].encode()).hexdigest()[:16]
+    return f'professor-{pk}-v{professor.content_version}-user-{request.user.pk}-{csrf_hash}'
+
+
+def _buffered_vote_state(request):
+    """وضعیت رأی‌های بافرشده کاربر (در حالت بافر رأی) یا None"""
+    from .vote_buffer import active_vote_buffer
+    buffer = active_vote_buffer()
+    if buffer is None or not request.user.is_authenticated:
+        return None
+    return buffer.user_state(request.user.pk)
+
+
+def professor_fragment_etag(request, pk):
+    """قطعه مشترک است ولی پاسخ JSON رأی‌های خود کاربر (همراه رأی‌های بافرشده) را هم دارد"""
+    professor = request_professor(request, pk)
+    if not professor:
+        return None
+    etag = f'professor-{pk}-v{professor.content_version}-user-{request.user.pk}'
+    buffered = _buffered_vote_state(request)
+    return f'{etag}-buffer-{buffered[0]}' if buffered else etag
+
+
+def professor_last_modified(request, pk):
+    professor = request_professor(request, pk)
+    if not professor:
+        return None
+    buffered = _buffered_vote_state(request)
+    return max(professor.content_changed_at, buffered[1]) if buffered else professor.content_changed_at
+
+
+def _live_search_validators(request):
+    """نسخه ایندکس‌های درون حافظه (تغییر یا حذف استاد) و آخرین تغییر محتوای اساتید"""
+    cached = getattr(request, '_live_search_validators', None)
+    if cached is None:
+        latest = Professor.objects.aggregate(latest=Max('content_changed_at'))['latest']
+        cached = (cache.get(PROFESSOR_INDEX_VERSION_KEY), latest)
+        request._live_search_validators = cached
+    return cached
+
+
+def _live_search_query(request):
+    return request.GET.get('query', '').strip()
+
+
+def live_search_etag(request):
+    """
+    hash متن جستجو در ETag می‌آید تا پاسخ یک جستجو برای جستجوی دیگر 304 نگیرد.
+    پاسخ خود query را برمی‌گرداند، پس hash روی متن پس از strip است (متن نرمال‌شده تابع آن است).
+    """
+    index_version, latest = _live_search_validators(request)
+    query_hash = hashlib.sha1(_live_search_query(request).encode()).hexdigest()[:16]
+    return f'live-search-{index_version}-{latest.timestamp() if latest else 0}-{query_hash}'
+
+
+def live_search_last_modified(request):
+    return _live_search_validators(request)[1]
+
+
+def user_daily_stats_etag(request):
+    if not request.user.is_authenticated:
+        return None
+    daily_limit = request_daily_limit(request)
+    return f'daily-{request.user.pk}-{daily_limit.date}-{daily_limit.review_count}-{daily_limit.question_count}'
 
 
 # =========================
@@ -45,14 +368,46 @@ def check_daily_limit(user, limit_type):
 # =========================
 def home(request):
     query = request.GET.get('query', '').strip()
-    professors = Professor.objects.all()
+    sort = request.GET.get('sort', DEFAULT_HOME_SORT)
+    if sort not in HOME_SORTS:
+        sort = DEFAULT_HOME_SORT
+    # شناسه نامعتبر یا خارج از بازه همان نبودن فیلتر است (مثل شناسه‌های vote_batch)
+    department = parse_id(request.GET.get('department'))
+    after = parse_id(request.GET.get('after'))
+    suggestion = None
+    next_after = None
+
     if query:
-        professors = professors.filter(
-            Q(name__icontains=query) | Q(department__icontains=query)
-        )
+        # نتایج جستجو به ترتیب ارتباط می‌مانند (sort نادیده گرفته می‌شود) و صفحه‌بندی
+        # روی شناسه‌هاست؛ ردیف‌های استاد فقط برای صفحه جاری خوانده می‌شوند
+        ids = find_professor_ids(query, department)
+        # اگر جستجوی دقیق چیزی نیافت، اساتید با نام مشابه (مقاوم به غلط املایی)
+        if not ids:
+            similar, suggestion = find_similar_professors(query)
+            if department:
+                similar = similar.filter(canonical_department_id=department)
+            ids = list(similar.values_list('pk', flat=True))
+        page = Paginator(ids, HOME_PAGE_SIZE).get_page(request.GET.get('page'))
+        professors = list(professors_in_order(page.object_list))
+    else:
+        professors = Professor.objects.all()
+        if department:
+            professors = professors.filter(canonical_department_id=department)
+        # مرتب‌سازی و آخرین استاد صفحه قبل (after) در URL هستند تا هر صفحه کلید کش مستقل داشته باشد
+        page = None
+        professors, next_after = home_page(professors, HOME_SORTS[sort][1], after)
+
     return render(request, 'reviews/home.html', {
         'professors': professors,
-        'query': query
+        'page': page,
+        'after': after,
+        'next_after': next_after,
+        'query': query,
+        'suggestion': suggestion,
+        'sort': sort,
+        'sorts': [(key, label) for key, (label, keys) in HOME_SORTS.items()],
+        'department': department,
+        'department_facets': department_facets(),
     })
 
 
@@ -118,318 +473,391 @@ def custom_login(request):
 def search_professors(request):
     form = ProfessorSearchForm(request.GET or None)
     results = None
+    suggestion = None
     
     if form.is_valid():
         query = form.cleaned_data['query']
         if query:
-            results = Professor.objects.filter(
-                Q(name__icontains=query) | Q(department__icontains=query)
-            )
+            results = list(find_professors(query))
+            if not results:
+                similar, suggestion = find_similar_professors(query)
+                results = list(similar)
     
-    return render(request, 'reviews/search.html', {
+    return render(request, 'reviews/search_results.html', {
         'form': form,
-        'results': results
+        'results': results,
+        'suggestion': suggestion,
     })
 
 
 # =========================
 # Professor Detail
 # =========================
+# بدنه صفحه (GET) برای همه کاربران یکسان است؛ پاسخ به خاطر login و نوار بالا
+# همچنان به cookie وابسته است و فقط در کش خصوصی مرورگر نگه داشته می‌شود
 @login_required
+@cache_control(private=True, no_cache=True)
+@vary_on_cookie
+@condition(etag_func=professor_detail_etag)
 def professor_detail(request, pk):
-    professor = get_object_or_404(Professor, pk=pk)
-
-    reviews = Review.objects.filter(
-        professor=professor,
-        is_approved=True
-    ).order_by('-created_at')
-
-    questions = Question.objects.filter(
-        professor=professor,
-        is_approved=True
-    ).order_by('-created_at')
-
-    for question in questions:
-        question.answers_approved = question.answers.filter(is_approved=True)
-
-    review_form = ReviewForm()
-    question_form = QuestionForm()
-    answer_form = AnswerForm()
-    message = None
-    error_message = None
-
-    if request.method == 'POST':
-        form_type = request.POST.get('form_type')
-
-        # -------- Review --------
-        if form_type == 'review':
-            can_post, limit_message = check_daily_limit(request.user, 'review')
+    professor = request_professor(request, pk)
+    if professor is None:
+        raise Http404
+
+    # فقط صفحه اول نظرات در بدنه است؛ صفحه‌های بعدی از professor_reviews_page،
+    # تب پرسش و پاسخ از professor_questions_page و بخش‌های شخصی (سهمیه، رأی‌ها،
+    # ارسال‌های در انتظار، پیام‌ها) از professor_personal_state بارگذاری می‌شوند.
+    if request.method != 'POST':
+        return render(request, 'reviews/professor_detail.html', {
+            'professor': professor,
+            'shell': professor_shell(professor),
+        })
+
+    form_type = request.POST.get('form_type')
+    shell_context = {}
+
+    # -------- Review --------
+    if form_type == 'review':
+        review_form = ReviewForm(request.POST)
+        if review_form.is_valid():
+            # بررسی تکراری نبودن نظر (برای جلوگیری از double submit)
+            existing_review = Review.objects.filter(
+                user=request.user,
+                professor=professor,
+                text=review_form.cleaned_data['text'],
+                rating=review_form.cleaned_data['rating'],
+                created_at__date=timezone.localdate()
+            ).first()
             
-            if not can_post:
-                messages.error(request, limit_message)
+            if existing_review:
+                messages.warning(request, 'این نظر قبلاً ثبت شده است.')
                 return redirect('reviews:professor_detail', pk=pk)
-            else:
-                review_form = ReviewForm(request.POST)
-                if review_form.is_valid():
-                    # بررسی تکراری نبودن نظر (برای جلوگیری از double submit)
-                    existing_review = Review.objects.filter(
-                        user=request.user,
-                        professor=professor,
-                        text=review_form.cleaned_data['text'],
-                        rating=review_form.cleaned_data['rating'],
-                        created_at__date=datetime.date.today()
-                    ).first()
-                    
-                    if existing_review:
-                        messages.warning(request, 'این نظر قبلاً ثبت شده است.')
-                        return redirect('reviews:professor_detail', pk=pk)
-                    
-                    review = review_form.save(commit=False)
-                    review.professor = professor
-                    review.user = request.user
-                    review.is_approved = False
-                    review.save()
-                    
-                    daily_limit = UserDailyLimit.get_or_create_today(request.user)
-                    daily_limit.increment_review()
-                    
-                    messages.success(request, 'نظر شما ثبت شد و پس از تأیید نمایش داده می‌شود.')
-                    
-                    # مهم: PRG Pattern - بعد از POST باید redirect کنیم
-                    return redirect('reviews:professor_detail', pk=pk)
-                else:
-                    error_message = 'لطفاً خطاهای فرم را اصلاح کنید.'
-
-        # -------- Question --------
-        elif form_type == 'question':
-            can_post, limit_message = check_daily_limit(request.user, 'question')
             
-            if not can_post:
-                messages.error(request, limit_message)
-                return redirect('reviews:professor_detail', pk=pk)
-            else:
-                question_form = QuestionForm(request.POST)
-                if question_form.is_valid():
-                    # بررسی تکراری نبودن پرسش (برای جلوگیری از double submit)
-                    existing_question = Question.objects.filter(
-                        user=request.user,
-                        professor=professor,
-                        text=question_form.cleaned_data['text'],
-                        created_at__date=datetime.date.today()
-                    ).first()
-                    
-                    if existing_question:
-                        messages.warning(request, 'این پرسش قبلاً ثبت شده است.')
-                        return redirect('reviews:professor_detail', pk=pk)
-                    
-                    question = question_form.save(commit=False)
-                    question.professor = professor
-                    question.user = request.user
-                    question.is_approved = False
-                    question.save()
-                    
-                    daily_limit = UserDailyLimit.get_or_create_today(request.user)
-                    daily_limit.increment_question()
-                    
-                    messages.success(request, 'پرسش شما ثبت شد و پس از تأیید نمایش داده می‌شود.')
-                    
-                    # مهم: PRG Pattern - بعد از POST باید redirect کنیم
+            # مصرف سهمیه و ثبت نظر در یک تراکنش
+            with transaction.atomic():
+                can_post, limit_message = consume_daily_limit(request.user, 'review')
+                if not can_post:
+                    messages.error(request, limit_message)
                     return redirect('reviews:professor_detail', pk=pk)
-                else:
-                    error_message = 'لطفاً خطاهای فرم را اصلاح کنید.'
-
-        # -------- Answer --------
-        elif form_type == 'answer':
-            question = get_object_or_404(
-                Question,
-                id=request.POST.get('question_id'),
-                professor=professor,
-                is_approved=True
-            )
-            answer_form = AnswerForm(request.POST)
-            if answer_form.is_valid():
-                # بررسی تکراری نبودن پاسخ (برای جلوگیری از double submit)
-                existing_answer = Answer.objects.filter(
-                    user=request.user,
-                    question=question,
-                    text=answer_form.cleaned_data['text'],
-                    created_at__date=datetime.date.today()
-                ).first()
                 
-                if existing_answer:
-                    messages.warning(request, 'این پاسخ قبلاً ثبت شده است.')
+                review = review_form.save(commit=False)
+                review.professor = professor
+                review.user = request.user
+                review.is_approved = False
+                review.save()
+            
+            messages.success(request, 'نظر شما ثبت شد و پس از تأیید نمایش داده می‌شود.')
+            
+            # مهم: PRG Pattern - بعد از POST باید redirect کنیم
+            return redirect('reviews:professor_detail', pk=pk)
+        else:
+            shell_context = {'review_form': review_form, 'error_tab': 'reviews'}
+
+    # -------- Question --------
+    elif form_type == 'question':
+        question_form = QuestionForm(request.POST)
+        if question_form.is_valid():
+            # بررسی تکراری نبودن پرسش (برای جلوگیری از double submit)
+            existing_question = Question.objects.filter(
+                user=request.user,
+                professor=professor,
+                text=question_form.cleaned_data['text'],
+                created_at__date=timezone.localdate()
+            ).first()
+            
+            if existing_question:
+                messages.warning(request, 'این پرسش قبلاً ثبت شده است.')
+                return redirect('reviews:professor_detail', pk=pk)
+            
+            # مصرف سهمیه و ثبت پرسش در یک تراکنش
+            with transaction.atomic():
+                can_post, limit_message = consume_daily_limit(request.user, 'question')
+                if not can_post:
+                    messages.error(request, limit_message)
                     return redirect('reviews:professor_detail', pk=pk)
                 
-                answer = answer_form.save(commit=False)
-                answer.question = question
-                answer.user = request.user
-                answer.is_approved = False
-                answer.save()
-                messages.success(request, 'پاسخ شما ثبت شد و پس از تأیید نمایش داده می‌شود.')
-                
-                # مهم: PRG Pattern - بعد از POST باید redirect کنیم
+                question = question_form.save(commit=False)
+                question.professor = professor
+                question.user = request.user
+                question.is_approved = False
+                question.save()
+            
+            messages.success(request, 'پرسش شما ثبت شد و پس از تأیید نمایش داده می‌شود.')
+            
+            # مهم: PRG Pattern - بعد از POST باید redirect کنیم
+            return redirect('reviews:professor_detail', pk=pk)
+        else:
+            shell_context = {'question_form': question_form, 'error_tab': 'questions'}
+
+    # -------- Answer --------
+    elif form_type == 'answer':
+        question = get_object_or_404(
+            Question,
+            id=request.POST.get('question_id'),
+            professor=professor,
+            is_approved=True
+        )
+        answer_form = AnswerForm(request.POST)
+        if answer_form.is_valid():
+            # بررسی تکراری نبودن پاسخ (برای جلوگیری از double submit)
+            existing_answer = Answer.objects.filter(
+                user=request.user,
+                question=question,
+                text=answer_form.cleaned_data['text'],
+                created_at__date=timezone.localdate()
+            ).first()
+            
+            if existing_answer:
+                messages.warning(request, 'این پاسخ قبلاً ثبت شده است.')
                 return redirect('reviews:professor_detail', pk=pk)
-            else:
-                error_message = 'لطفاً خطاهای فرم را اصلاح کنید.'
-
-    # بعد از redirect، پیام‌ها را از session بخوان
-    storage = messages.get_messages(request)
-    for message in storage:
-        if message.tags == 'success':
-            message = str(message)
-        elif message.tags == 'error':
-            error_message = str(message)
-
-    daily_limit = UserDailyLimit.get_or_create_today(request.user)
-    review_limit_info = {
-        'remaining': DAILY_REVIEW_LIMIT - daily_limit.review_count,
-        'total': DAILY_REVIEW_LIMIT,
-        'reached_limit': daily_limit.review_count >= DAILY_REVIEW_LIMIT
-    }
-    
-    question_limit_info = {
-        'remaining': DAILY_QUESTION_LIMIT - daily_limit.question_count,
-        'total': DAILY_QUESTION_LIMIT,
-        'reached_limit': daily_limit.question_count >= DAILY_QUESTION_LIMIT
-    }
+            
+            answer = answer_form.save(commit=False)
+            answer.question = question
+            answer.user = request.user
+            answer.is_approved = False
+            answer.save()
+            messages.success(request, 'پاسخ شما ثبت شد و پس از تأیید نمایش داده می‌شود.')
+            
+            # مهم: PRG Pattern - بعد از POST باید redirect کنیم
+            return redirect('reviews:professor_detail', pk=pk)
+        else:
+            shell_context = {'answer_form': answer_form, 'error_tab': 'questions'}
 
-    context = {
-        'professor': professor,
-        'reviews': reviews,
-        'questions': questions,
-        'review_form': review_form,
-        'question_form': question_form,
-        'answer_form': answer_form,
-        'message': message,
-        'error_message': error_message,
-        'review_limit': review_limit_info,
-        'question_limit': question_limit_info,
-        'DAILY_REVIEW_LIMIT': DAILY_REVIEW_LIMIT,  # برای استفاده در تمپلیت
-        'DAILY_QUESTION_LIMIT': DAILY_QUESTION_LIMIT,  # برای استفاده در تمپلیت
-    }
-    return render(request, 'reviews/professor_detail.html', context)
+    # فرم نامعتبر: بدنه با فرم پرشده و خطاها برای همین کاربر رندر می‌شود (بدون کش)
+    shell = render_to_string('reviews/partials/professor_shell.html', professor_shell_context(
+        professor, error_message='لطفاً خطاهای فرم را اصلاح کنید.', **shell_context
+    ), request=request)
+    return render(request, 'reviews/professor_detail.html', {'professor': professor, 'shell': shell})
 
 
 # =========================
-# Vote Review (AJAX)
+# Professor Reviews Page (AJAX)
 # =========================
 @login_required
-def vote_review(request):
-    if request.method != "POST":
-        return JsonResponse({"error": "Invalid method"}, status=400)
+@condition(etag_func=professor_fragment_etag, last_modified_func=professor_last_modified)
+def professor_reviews_page(request, pk):
+    """صفحه‌های بعدی نظرات استاد به صورت HTML آماده درج و cursor صفحه بعد"""
+    professor = request_professor(request, pk)
+    if professor is None:
+        raise Http404
+    cursor = decode_cursor(request.GET.get('cursor'))
+    if cursor is None:
+        return JsonResponse({'error': 'cursor نامعتبر است'}, status=400)
 
-    review_id = request.POST.get("review_id")
-    value = request.POST.get("value")
-    
-    if not review_id or not value:
-        return JsonResponse({"error": "Missing parameters"}, status=400)
-    
-    try:
-        value = int(value)
-        if value not in (1, -1):
-            return JsonResponse({"error": "Invalid value"}, status=400)
-    except (ValueError, TypeError):
-        return JsonResponse({"error": "Value must be integer"}, status=400)
+    fragment = review_fragment(professor, cursor)
+    return JsonResponse({**fragment, 'votes': user_votes(request.user, 'review', fragment['vote_ids'])})
 
-    try:
-        review = Review.objects.get(id=review_id, is_approved=True)
-    except Review.DoesNotExist:
-        return JsonResponse({"error": "Review not found or not approved"}, status=404)
-
-    vote, created = ReviewVote.objects.get_or_create(
-        review=review,
-        user=request.user,
-        defaults={"value": value}
+
+# =========================
+# Professor Questions Page (AJAX)
+# =========================
+@login_required
+@condition(etag_func=professor_fragment_etag, last_modified_func=professor_last_modified)
+def professor_questions_page(request, pk):
+    """
+    تب پرسش و پاسخ: بدون cursor صفحه اول و با cursor صفحه‌های بعدی،
+    به صورت HTML آماده درج (همراه فرم پاسخ بدون CSRF token) و cursor صفحه بعد
+    """
+    professor = request_professor(request, pk)
+    if professor is None:
+        raise Http404
+    cursor = None
+    if request.GET.get('cursor'):
+        cursor = decode_cursor(request.GET['cursor'])
+        if cursor is None:
+            return JsonResponse({'error': 'cursor نامعتبر است'}, status=400)
+
+    fragment = question_fragment(professor, cursor)
+    return JsonResponse({**fragment, 'votes': user_votes(request.user, 'answer', fragment['vote_ids'])})
+
+
+# =========================
+# Professor Personal State (AJAX)
+# =========================
+def daily_limit_info(daily_limit):
+    """سهمیه باقی‌مانده نظر و پرسش امروز: (review_limit, question_limit)"""
+    return (
+        {
+            'remaining': DAILY_REVIEW_LIMIT - daily_limit.review_count,
+            'total': DAILY_REVIEW_LIMIT,
+            'reached_limit': daily_limit.review_count >= DAILY_REVIEW_LIMIT,
+        },
+        {
+            'remaining': DAILY_QUESTION_LIMIT - daily_limit.question_count,
+            'total': DAILY_QUESTION_LIMIT,
+            'reached_limit': daily_limit.question_count >= DAILY_QUESTION_LIMIT,
+        },
     )
 
-    if not created and vote.value == value:
-        vote.delete()
-    else:
-        vote.value = value
-        vote.save()
 
-    likes_count = review.likes_count()
-    dislikes_count = review.dislikes_count()
+def _pending_items(queryset, kind):
+    return [
+        {'kind': kind, 'id': item['id'], 'text': item['text'], 'created_at': item['created_at'].isoformat()}
+        for item in queryset.filter(is_approved=False).order_by('-created_at').values(
+            'id', 'text', 'created_at'
+        )[:PENDING_SUBMISSIONS_LIMIT]
+    ]
+
+
+@login_required
+@never_cache
+def professor_personal_state(request, pk):
+    """
+    بخش‌های شخصی صفحه استاد که از بدنه مشترک جدا شده‌اند: سهمیه امروز،
+    رأی‌های خود کاربر به نظرات صفحه اول، ارسال‌های در انتظار
+    تأیید، پیام‌های session و CSRF token فرم‌های بدنه. پیام‌ها با خواندن
+    مصرف می‌شوند، پس پاسخ هرگز کش نمی‌شود.
+    """
+    professor = request_professor(request, pk)
+    if professor is None:
+        raise Http404
+    user = request.user
+    review_limit, question_limit = daily_limit_info(request_daily_limit(request))
+
+    pending = (
+        _pending_items(Review.objects.filter(user=user, professor=professor), 'review')
+        + _pending_items(Question.objects.filter(user=user, professor=professor), 'question')
+        + _pending_items(Answer.objects.filter(user=user, question__professor=professor), 'answer')
+    )
+    pending.sort(key=lambda item: item['created_at'], reverse=True)
 
     return JsonResponse({
-        "likes_count": likes_count,
-        "dislikes_count": dislikes_count
+        'csrf_token': get_token(request),
+        'review_limit': review_limit,
+        'question_limit': question_limit,
+        # رأی‌ها فقط برای نظرات صفحه اول بدنه؛ صفحه‌های بعدی و پاسخ‌ها رأی‌های
+        # کاربر را همراه قطعه خودشان (professor_reviews_page/professor_questions_page) می‌گیرند
+        'review_votes': user_votes(user, 'review', review_fragment(professor)['vote_ids']),
+        'pending': pending[:PENDING_SUBMISSIONS_LIMIT],
+        'messages': [
+            {'tags': message.tags, 'text': str(message)}
+            for message in messages.get_messages(request)
+        ],
     })
 
 
 # =========================
-# Vote Answer (AJAX)
+# Vote Review / Answer (AJAX)
 # =========================
-@login_required
-def vote_answer_ajax(request):
+def _vote_response(request, kind, id_param):
+    """پارامترهای رأی را بررسی و رأی را با موتور مشترک (voting.toggle_vote) ثبت می‌کند"""
     if request.method != "POST":
         return JsonResponse({"error": "Invalid method"}, status=400)
 
-    answer_id = request.POST.get("answer_id")
+    target_id = request.POST.get(id_param)
     value = request.POST.get("value")
     
-    if not answer_id or not value:
+    if not target_id or not value:
         return JsonResponse({"error": "Missing parameters"}, status=400)
     
     try:
+        target_id = int(target_id)
         value = int(value)
-        if value not in (1, -1):
+        if value not in VOTE_VALUES:
             return JsonResponse({"error": "Invalid value"}, status=400)
     except (ValueError, TypeError):
         return JsonResponse({"error": "Value must be integer"}, status=400)
 
-    try:
-        answer = Answer.objects.get(id=answer_id, is_approved=True)
-    except Answer.DoesNotExist:
-        return JsonResponse({"error": "Answer not found or not approved"}, status=404)
-
-    vote, created = AnswerVote.objects.get_or_create(
-        answer=answer,
-        user=request.user,
-        defaults={"value": value}
-    )
-
-    if not created and vote.value == value:
-        vote.delete()
-    else:
-        vote.value = value
-        vote.save()
-
-    likes_count = answer.likes_count()
-    dislikes_count = answer.dislikes_count()
+    counts = toggle_vote(kind, target_id, request.user, value)
+    if counts is None:
+        return JsonResponse({"error": f"{kind.capitalize()} not found or not approved"}, status=404)
 
+    likes_count, dislikes_count = counts
     return JsonResponse({
         "likes_count": likes_count,
         "dislikes_count": dislikes_count
     })
 
 
+@login_required
+def vote_review(request):
+    return _vote_response(request, 'review', 'review_id')
+
+
+@login_required
+def vote_answer_ajax(request):
+    return _vote_response(request, 'answer', 'answer_id')
+
+
+# =========================
+# Vote Batch (AJAX)
+# =========================
+@login_required
+def vote_batch(request):
+    """
+    چند رأی در یک درخواست JSON: {"votes": [{"kind": "review"|"answer", "id": ..., "value": 1|-1}, ...]}
+    به ترتیب کلیک و در یک تراکنش اعمال می‌شوند؛ خروجی شمارنده‌های جدید و رأی
+    نهایی کاربر (0 یعنی بدون رأی) برای هر هدف و هدف‌های یافت‌نشده یا تأیید‌نشده.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid method"}, status=400)
+
+    try:
+        votes = json.loads(request.body)['votes']
+        operations = [(vote['kind'], int(vote['id']), int(vote['value'])) for vote in votes]
+        if not all(isinstance(kind, str) for kind, target_id, value in operations):
+            raise TypeError('kind')
+    except (ValueError, TypeError, KeyError, OverflowError):
+        return JsonResponse({"error": "Invalid payload"}, status=400)
+
+    if not operations or len(operations) > VOTE_BATCH_LIMIT:
+        return JsonResponse({"error": f"Between 1 and {VOTE_BATCH_LIMIT} votes are allowed"}, status=400)
+    # شناسه باید در بازه INTEGER دیتابیس باشد تا به پارامتر کوئری تبدیل شود
+    if any(
+        kind not in VOTE_KINDS or value not in VOTE_VALUES or not 0 < target_id < 2 ** 63
+        for kind, target_id, value in operations
+    ):
+        return JsonResponse({"error": "Invalid value"}, status=400)
+
+    results = apply_votes(request.user, operations)
+    targets = dict.fromkeys((kind, target_id) for kind, target_id, value in operations)
+    return JsonResponse({
+        "results": [
+            {"kind": kind, "id": target_id, "likes_count": likes_count, "dislikes_count": dislikes_count, "vote": vote}
+            for (kind, target_id), (likes_count, dislikes_count, vote) in results.items()
+        ],
+        "not_found": [
+            {"kind": kind, "id": target_id} for kind, target_id in targets if (kind, target_id) not in results
+        ],
+    })
+
+
 # =========================
 # Live Search
 # =========================
+@condition(etag_func=live_search_etag, last_modified_func=live_search_last_modified)
 def live_search_professors(request):
-    query = request.GET.get('query', '').strip()
-    professors = Professor.objects.all()
-    if query:
-        professors = professors.filter(
-            Q(name__icontains=query) | Q(department__icontains=query)
-        )
+    query = _live_search_query(request)
+
+    # ابتدا ایندکس پیشوندی درون حافظه؛ اگر چیزی نیافت، جستجوی تمام‌متن
+    ids = professor_prefix_index.lookup(query, LIVE_SEARCH_LIMIT)
+    if ids:
+        professors = list(professors_in_order(ids))
+    else:
+        professors = list(find_professors(query, limit=LIVE_SEARCH_LIMIT))
 
     html = render_to_string(
         'reviews/partials/professor_list.html',
         {'professors': professors},
         request=request
     )
-    return JsonResponse({'html': html})
+    # query برگردانده می‌شود تا کلاینت پاسخ‌های خارج از ترتیب را نادیده بگیرد
+    return JsonResponse({
+        'html': html,
+        'query': query,
+        'count': len(professors),
+        'limit': LIVE_SEARCH_LIMIT,
+    })
 
 
 # =========================
 # User Daily Stats
 # =========================
 @login_required
+@condition(etag_func=user_daily_stats_etag)
 def user_daily_stats(request):
     """نمایش آمار روزانه کاربر"""
-    daily_limit = UserDailyLimit.get_or_create_today(request.user)
+    daily_limit = request_daily_limit(request)
     
     return JsonResponse({
         'review_count': daily_limit.review_count,
@@ -0,0 +1,315 @@
+"""
+بافر رأی (write-behind) برای ترافیک سنگین رأی
+
+در حالت عادی هر رأی همان لحظه با موتور voting در دیتابیس نوشته می‌شود. با
+VOTE_BUFFER_ENABLED = True رأی‌ها فقط در حافظه پروسس ثبت می‌شوند و یک نخ
+پس‌زمینه هر VOTE_BUFFER_FLUSH_INTERVAL ثانیه آن‌ها را دسته‌ای می‌نویسد:
+
+- کلید بافر (نوع، هدف، کاربر) است و آخرین رأی برنده است؛ ده کلیک پشت سر هم
+  یک کاربر روی یک نظر در flush به حداکثر یک نوشتن تبدیل می‌شود.
+- هر تغییر بافر یک خط JSON به فایل ژورنال (VOTE_BUFFER_JOURNAL) اضافه می‌کند؛
+  اگر پروسس پیش از flush بسته شود، رأی‌ها در شروع بعدی از ژورنال خوانده و
+  نوشته می‌شوند. پس از هر flush موفق ژورنال خالی می‌شود.
+- flush رأی نهایی را می‌نویسد (نه toggle)، پس تکرار آن بی‌اثر است و اگر پروسس
+  بین commit و بازنویسی ژورنال بسته شود، بازخوانی ژورنال چیزی را دو بار
+  نمی‌شمارد.
+- flush رأی‌ها را زیر قفل از بافر جدا می‌کند و بیرون از قفل می‌نویسد، پس رأی‌های
+  تازه پشت نوشتن دیتابیس نمی‌مانند. رأی‌های در حال نوشتن تا commit در پاسخ‌ها
+  دیده می‌شوند و اگر نوشتن ناموفق باشد به بافر برمی‌گردند.
+- پاسخ رأی و رأی‌های کاربر (user_votes) با بافر ادغام می‌شوند، پس کاربر رأی
+  خودش و شمارنده‌های به‌روز را بلافاصله می‌بیند؛ قطعه‌های کش‌شده صفحه استاد
+  برای بقیه پس از flush به‌روز می‌شوند. ETag و Last-Modified قطعه‌ها وضعیت
+  بافر کاربر (user_state) را هم دارند تا 304 نقشه رأی قدیمی برنگرداند.
+
+بافر در حافظه یک پروسس است: این حالت فقط برای اجرا با یک پروسس (چند نخ) درست
+است. پیش از خاموش کردن سرور یا عوض کردن حالت، دستور flush_votes را اجرا کنید.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .voting import VOTE_KINDS, _toggled
+
+logger = logging.getLogger(__name__)
+
+
+def _counts(value):
+    """سهم یک رأی در (likes_count, dislikes_count)"""
+    return int(value == 1), int(value == -1)
+
+
+class VoteBuffer:
+    """رأی‌های ثبت‌شده و هنوز نوشته‌نشده، همراه ژورنال اختیاری روی فایل"""
+
+    def __init__(self, journal_path=None):
+        self.journal_path = journal_path
+        self._lock = threading.RLock()
+        # {(kind, target_id, user_id): {'value': رأی نهایی, 'base': رأی فعلی در دیتابیس}}
+        self._entries = {}
+        # {(kind, target_id): [دلتای likes_count, دلتای dislikes_count]}
+        self._deltas = {}
+        # رأی‌ها و دلتاهایی که flush در حال نوشتن آن‌هاست (تا commit هنوز در دیتابیس نیستند)
+        self._flushing = {}
+        self._flushing_deltas = {}
+        # یک flush در هر زمان؛ جدا از _lock تا ثبت رأی منتظر نوشتن دیتابیس نماند
+        self._flush_lock = threading.Lock()
+        self._loaded = False
+        self._thread = None
+        # شمار flushهای موفق؛ اگر بین خواندن هدف‌ها و گرفتن قفل عوض شود، خواندن تکرار می‌شود
+        self._flushes = 0
+        # {user_id: (شمار تغییرها، زمان آخرین تغییر)} برای اعتبارسنج‌های HTTP
+        self._user_changes = {}
+        self._token = uuid.uuid4().hex[:8]
+
+    # ==================== ثبت و خواندن ====================
+
+    def apply(self, user, grouped):
+        """
+        ثبت رأی‌های کاربر در بافر؛ grouped: {kind: {target_id: [value, ...]}} به ترتیب کلیک.
+        خروجی مثل voting.apply_votes: {(kind, target_id): (likes_count, dislikes_count, رأی نهایی)}
+        که شمارنده‌ها با رأی‌های بافر ادغام شده‌اند. هدف‌ها بیرون از قفل خوانده می‌شوند.
+        """
+        while True:
+            flushes = self._flushes
+            rows = {kind: self._targets(kind, operations, user) for kind, operations in grouped.items()}
+            with self._lock:
+                # flush همزمان رأی و شمارنده‌های ذخیره‌شده را عوض کرده است
+                if self._flushes != flushes:
+                    continue
+                return self._buffer_votes(user, grouped, rows)
+
+    def _targets(self, kind, operations, user):
+        """هدف‌های تأیید شده با شمارنده‌ها و رأی ذخیره‌شده کاربر: [(id, likes, dislikes, رأی)]"""
+        vote_kind = VOTE_KINDS[kind]
+        old_vote = vote_kind.votes().filter(
+            user_id=user.pk, target_id=OuterRef('pk')
+        ).values('value')[:1]
+        return list(vote_kind.target_model.objects.filter(
+            pk__in=list(operations), is_approved=True
+        ).annotate(old_vote=Subquery(old_vote)).values_list(
+            'pk', 'likes_count', 'dislikes_count', 'old_vote'
+        ))
+
+    def _buffer_votes(self, user, grouped, rows):
+        self._load()
+        results, records = {}, []
+        for kind, operations in grouped.items():
+            for target_id, likes_count, dislikes_count, stored in rows[kind]:
+                key = (kind, target_id, user.pk)
+                entry = self._entries.get(key)
+                if entry:
+                    base = entry['base']
+                else:
+                    # رأی در حال نوشتن پس از commit همان رأی دیتابیس است
+                    flushing = self._flushing.get(key)
+                    base = flushing['value'] if flushing else (stored or 0)
+                value = _toggled(entry['value'] if entry else base, operations[target_id])
+                self._set(key, value, base)
+                records.append({'kind': kind, 'target': target_id, 'user': user.pk,
+                                'value': value, 'base': base})
+                likes_delta, dislikes_delta = self._target_delta((kind, target_id))
+                results[kind, target_id] = (likes_count + likes_delta, dislikes_count + dislikes_delta, value)
+        if records:
+            changes = self._user_changes.get(user.pk, (0, None))[0]
+            self._user_changes[user.pk] = (changes + 1, timezone.now())
+        self._append(records)
+        return results
+
+    def _target_delta(self, target):
+        """دلتای شمارنده‌های هدف نسبت به دیتابیس: رأی‌های بافر به اضافه رأی‌های در حال نوشتن"""
+        likes, dislikes = self._deltas.get(target, (0, 0))
+        flushing_likes, flushing_dislikes = self._flushing_deltas.get(target, (0, 0))
+        return likes + flushing_likes, dislikes + flushing_dislikes
+
+    def user_state(self, user_id):
+        """
+        (برچسب، زمان آخرین تغییر) رأی‌های بافرشده کاربر برای ETag/Last-Modified،
+        یا None اگر کاربر از آخرین flush رأی بافرشده‌ای نداشته باشد.
+        """
+        with self._lock:
+            changes, changed_at = self._user_changes.get(user_id, (0, None))
+            if not changes:
+                return None
+            return f'{self._token}.{self._flushes}.{changes}', changed_at
+
+    def overlay(self, kind, user_id, target_ids, votes):
+        """ادغام رأی‌های بافرشده کاربر با votes ({target_id: value} خوانده‌شده از دیتابیس)"""
+        with self._lock:
+            self._load()
+            if not self._entries and not self._flushing:
+                return votes
+            votes = dict(votes)
+            for target_id in target_ids:
+                key = (kind, target_id, user_id)
+                entry = self._entries.get(key) or self._flushing.get(key)
+                if entry is None:
+                    continue
+                if entry['value']:
+                    votes[target_id] = entry['value']
+                else:
+                    votes.pop(target_id, None)
+        return votes
+
+    def pending_count(self):
+        with self._lock:
+            self._load()
+            return len(self._entries.keys() | self._flushing.keys())
+
+    def _set(self, key, value, base):
+        """به‌روزرسانی یک کلید بافر و دلتای شمارنده‌های هدف آن"""
+        entry = self._entries.pop(key, None)
+        previous = entry['value'] if entry else base
+        if value != base:
+            self._entries[key] = {'value': value, 'base': base}
+        if previous == value:
+            return
+        deltas = self._deltas.setdefault(key[:2], [0, 0])
+        for i, (new, old) in enumerate(zip(_counts(value), _counts(previous))):
+            deltas[i] += new - old
+
+    # ==================== نوشتن در دیتابیس ====================
+
+    def flush(self):
+        """
+        نوشتن همه رأی‌های بافر در یک تراکنش (برای هر نوع و کاربر یک فراخوانی set_votes).
+        رأی‌ها زیر قفل از بافر جدا و بیرون از آن نوشته می‌شوند؛ در صورت خطا به بافر
+        برمی‌گردند (ژورنال دست نمی‌خورد) و خطا بالا می‌رود.
+        خروجی: تعداد رأی‌های نوشته‌شده.
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._load()
+                if not self._entries:
+                    return 0
+                self._flushing, self._entries = self._entries, {}
+                self._flushing_deltas, self._deltas = self._deltas, {}
+                changes = {user_id: count for user_id, (count, changed_at) in self._user_changes.items()}
+
+            per_user = {}
+            for (kind, target_id, user_id), entry in self._flushing.items():
+                per_user.setdefault((kind, user_id), {})[target_id] = entry['value']
+            locked = False
+            try:
+                with transaction.atomic():
+                    for (kind, user_id), values in per_user.items():
+                        VOTE_KINDS[kind].set_votes(user_id, values)
+                    # COMMIT زیر قفل: apply هدف‌ها را یا پیش از commit می‌خواند و رأی‌های در
+                    # حال نوشتن را حساب می‌کند، یا بعد از پاک شدن آن‌ها و با _flushes تازه
+                    self._lock.acquire()
+                    locked = True
+            except BaseException:
+                if not locked:
+                    self._lock.acquire()
+                try:
+                    self._restore_flushing()
+                finally:
+                    self._lock.release()
+                raise
+
+            try:
+                flushed = len(self._flushing)
+                self._flushing, self._flushing_deltas = {}, {}
+                self._flushes += 1
+                # کاربرانی که حین نوشتن رأی تازه داده‌اند در اعتبارسنج‌ها می‌مانند
+                for user_id, count in changes.items():
+                    if self._user_changes[user_id][0] == count:
+                        del self._user_changes[user_id]
+                self._rewrite_journal()
+            finally:
+                self._lock.release()
+        return flushed
+
+    def _restore_flushing(self):
+        """برگرداندن رأی‌های flush ناموفق زیر رأی‌هایی که حین نوشتن ثبت شده‌اند"""
+        for key, entry in self._flushing.items():
+            newer = self._entries.get(key)
+            if newer is None:
+                self._entries[key] = entry
+                continue
+            # رأی تازه نسبت به رأی در حال نوشتن ثبت شده بود؛ مبنای آن دوباره رأی دیتابیس است
+            newer['base'] = entry['base']
+            if newer['value'] == newer['base']:
+                del self._entries[key]
+        for target, (likes, dislikes) in self._flushing_deltas.items():
+            deltas = self._deltas.setdefault(target, [0, 0])
+            deltas[0] += likes
+            deltas[1] += dislikes
+        self._flushing, self._flushing_deltas = {}, {}
+
+    def start(self, interval):
+        """شروع نخ پس‌زمینه flush (یک بار)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, args=(interval,), name='vote-buffer-flusher', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self, interval):
+        # دور اول بلافاصله: رأی‌های بازخوانی‌شده از ژورنال زود نوشته می‌شوند
+        while True:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('نوشتن بافر رأی ناموفق بود؛ در دور بعد دوباره تلاش می‌شود')
+            finally:
+                connections.close_all()
+            time.sleep(interval)
+
+    # ==================== ژورنال ====================
+
+    def _append(self, records, mode='a'):
+        if not self.journal_path or not (records or mode == 'w'):
+            return
+        with open(self.journal_path, mode, encoding='utf-8') as journal:
+            journal.write(''.join(json.dumps(record) + '\n' for record in records))
+            journal.flush()
+
+    def _rewrite_journal(self):
+        """ژورنال پس از flush موفق فقط رأی‌هایی را دارد که حین نوشتن ثبت شده‌اند"""
+        self._append([
+            {'kind': kind, 'target': target_id, 'user': user_id, 'value': entry['value'], 'base': entry['base']}
+            for (kind, target_id, user_id), entry in self._entries.items()
+        ], mode='w')
+
+    def _load(self):
+        """بازخوانی ژورنال در اولین استفاده؛ خط‌های ناقص (مثلاً نوشتن نیمه‌کاره) نادیده گرفته می‌شوند"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                    key = (record['kind'], int(record['target']), int(record['user']))
+                    value, base = int(record['value']), int(record['base'])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if key[0] in VOTE_KINDS:
+                    self._set(key, value, base)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def active_vote_buffer():
+    """بافر رأی پروسس اگر VOTE_BUFFER_ENABLED روشن باشد، وگرنه None"""
+    global _buffer
+    if not getattr(settings, 'VOTE_BUFFER_ENABLED', False):
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = VoteBuffer(getattr(settings, 'VOTE_BUFFER_JOURNAL', None))
+            _buffer.start(getattr(settings, 'VOTE_BUFFER_FLUSH_INTERVAL', 5))
+    return _buffer
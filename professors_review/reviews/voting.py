@@ -0,0 +1,307 @@
+"""
+موتور مشترک رأی (لایک/دیس‌لایک) به نظرات و پاسخ‌ها
+
+همه رأی‌ها در یک جدول (models.Vote) با کلید یکتای (target_type, target_id, user)
+ذخیره می‌شوند و هر مدل هدف با register_vote_target به آن وصل می‌شود؛ هدف باید
+ستون‌های is_approved، likes_count و dislikes_count و مسیری تا استاد داشته باشد.
+
+رأی toggle است: رأی تکراری حذف و رأی مخالف جایگزین می‌شود. رأی‌های یک کاربر
+به هر تعداد هدف از یک نوع، در یک تراکنش و با حداکثر سه دستور ثبت می‌شوند:
+
+1. UPDATE شمارنده‌های هدف‌ها با RETURNING: دلتای likes_count/dislikes_count هر
+   هدف از رأی قبلی کاربر (یک زیرکوئری روی ایندکس یکتای رأی) در خود SQL
+   محاسبه می‌شود و شمارنده‌های جدید، رأی قبلی و استاد هدف برگردانده می‌شوند.
+   شرط is_approved هم در همین دستور است، پس SELECT جداگانه‌ای برای هدف‌ها لازم
+   نیست. اولین دستور تراکنش یک نوشتن است، پس قفل نوشتن از ابتدا گرفته می‌شود
+   و رأی‌های همزمان به یک هدف پشت سر هم اجرا می‌شوند.
+2. یک DELETE برای رأی‌هایی که برداشته شده‌اند.
+3. یک INSERT ... ON CONFLICT DO UPDATE برای رأی‌های جدید یا عوض‌شده؛ کلیک
+   دوباره همزمان هرگز به IntegrityError نمی‌رسد.
+
+چون سیگنال‌های مدل رأی اجرا نمی‌شوند، نسخه محتوای استاد همین‌جا عوض می‌شود.
+"""
+from functools import cached_property
+
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete
+
+from .caching import bump_professor_content
+from .models import Answer, Review, Vote, delete_votes_on_target_delete
+
+VOTE_VALUES = (1, -1)
+VOTE_BATCH_LIMIT = 50  # حداکثر رأی در یک درخواست دسته‌ای
+PREVIOUS_VALUES = (1, -1, 0)  # رأی‌های قبلی ممکن؛ 0 یعنی بدون رأی
+SUBTRACT_CHUNK_SIZE = 200  # تعداد هدف در هر UPDATE کاهش، برای محدودیت عمق عبارت SQLite
+
+
+def _qualified(model, field_name):
+    field = model._meta.get_field(field_name)
+    return f'{connection.ops.quote_name(model._meta.db_table)}.{connection.ops.quote_name(field.column)}'
+
+
+def _related_sql(model, path):
+    """عبارت SQL ستون path (مثل question__professor) از ردیف model، با زیرکوئری برای هر رابطه میانی"""
+    name, _, rest = path.partition('__')
+    column = _qualified(model, name)
+    if not rest:
+        return column
+    related = model._meta.get_field(name).related_model
+    return (
+        f'(SELECT {_related_sql(related, rest)} FROM {connection.ops.quote_name(related._meta.db_table)} '
+        f'WHERE {_qualified(related, related._meta.pk.name)} = {column})'
+    )
+
+
+def _toggled(old, values):
+    """رأی نهایی پس از اعمال پشت سر هم رأی‌های values روی رأی قبلی old (0 یعنی بدون رأی)"""
+    for value in values:
+        old = 0 if old == value else value
+    return old
+
+
+class VoteKind:
+    """یک نوع هدف رأی: مدل هدف و مسیر آن تا استاد؛ نوع (kind) نام مدل هدف است"""
+
+    def __init__(self, target_model, professor_path):
+        self.target_model = target_model
+        self.kind = target_model._meta.model_name
+        self.professor_path = professor_path
+
+    @cached_property
+    def _columns(self):
+        qn = connection.ops.quote_name
+        meta = Vote._meta
+        return {
+            'vote_table': qn(meta.db_table),
+            'target_type': qn(meta.get_field('target_type').column),
+            'target': qn(meta.get_field('target_id').column),
+            'user': qn(meta.get_field('user').column),
+            'value': qn(meta.get_field('value').column),
+            'target_table': qn(self.target_model._meta.db_table),
+            'target_pk': _qualified(self.target_model, self.target_model._meta.pk.name),
+            'approved': _qualified(self.target_model, 'is_approved'),
+            'professor': _related_sql(self.target_model, self.professor_path),
+        }
+
+    def _counters_sql(self, finals):
+        """
+        UPDATE شمارنده‌ها برای {target_id: {رأی قبلی: رأی نهایی}}.
+        شناسه‌ها و دلتاها عدد صحیح هستند و مستقیم در SQL قرار می‌گیرند.
+        """
+        c = self._columns
+        old = (
+            f'(SELECT {c["vote_table"]}.{c["value"]} FROM {c["vote_table"]} '
+            f'WHERE {c["vote_table"]}.{c["target"]} = {c["target_pk"]} '
+            f'AND {c["vote_table"]}.{c["target_type"]} = %(kind)s '
+            f'AND {c["vote_table"]}.{c["user"]} = %(user)s)'
+        )
+
+        def delta(counter):
+            # برای هر رأی قبلی ممکن، دلتای هر هدف با یک CASE روی شناسه
+            branches = []
+            for previous in PREVIOUS_VALUES:
+                cases = ' '.join(
+                    f'WHEN {int(target_id)} THEN {int(final[previous] == counter) - int(previous == counter)}'
+                    for target_id, final in finals.items()
+                )
+                branches.append(f'CASE {c["target_pk"]} {cases} ELSE 0 END')
+            return f'CASE {old} WHEN 1 THEN {branches[0]} WHEN -1 THEN {branches[1]} ELSE {branches[2]} END'
+
+        ids = ', '.join(str(int(target_id)) for target_id in finals)
+        return (
+            f'UPDATE {c["target_table"]} SET '
+            f'likes_count = likes_count + {delta(1)}, '
+            f'dislikes_count = dislikes_count + {delta(-1)} '
+            f'WHERE {c["target_pk"]} IN ({ids}) AND {c["approved"]} = %(approved)s '
+            f'RETURNING {c["target_pk"]}, likes_count, dislikes_count, {old}, {c["professor"]}'
+        )
+
+    def apply(self, user, operations):
+        """
+        اعمال رأی‌های کاربر؛ operations: {target_id: [value, ...]} به ترتیب کلیک.
+        خروجی: {target_id: (likes_count, dislikes_count, رأی نهایی کاربر)} فقط برای
+        هدف‌های موجود و تأیید شده؛ بقیه نادیده گرفته می‌شوند.
+        """
+        if any(value not in VOTE_VALUES for values in operations.values() for value in values):
+            raise ValueError('رأی نامعتبر')
+        return self._write(user.pk, {
+            target_id: {previous: _toggled(previous, values) for previous in PREVIOUS_VALUES}
+            for target_id, values in operations.items()
+        })
+
+    def set_votes(self, user_id, values):
+        """
+        نوشتن رأی نهایی کاربر (بدون toggle)؛ values: {target_id: value} که 0 یعنی
+        بدون رأی. تکرار آن بی‌اثر است (بافر رأی از آن برای flush استفاده می‌کند).
+        """
+        return self._write(user_id, {
+            target_id: dict.fromkeys(PREVIOUS_VALUES, value) for target_id, value in values.items()
+        })
+
+    def _write(self, user_id, finals):
+        """finals: {target_id: {رأی قبلی: رأی نهایی}}"""
+        if not finals:
+            return {}
+        c = self._columns
+        params = {'kind': self.kind, 'user': user_id, 'approved': True}
+        results = {}
+        removed, upserted = [], []
+        # داخل apply_votes بخشی از تراکنش بیرونی است و savepoint جداگانه نمی‌خواهد
+        with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+            cursor.execute(self._counters_sql(finals), params)
+            professor_ids = set()
+            for target_id, likes_count, dislikes_count, old_value, professor_id in cursor.fetchall():
+                new_value = finals[target_id][old_value or 0]
+                results[target_id] = (likes_count, dislikes_count, new_value)
+                professor_ids.add(professor_id)
+                if new_value == (old_value or 0):
+                    continue
+                if new_value:
+                    upserted.append(Vote(target_type=self.kind, target_id=target_id, user_id=user_id, value=new_value))
+                else:
+                    removed.append(target_id)
+
+            if removed:
+                cursor.execute(
+                    f'DELETE FROM {c["vote_table"]} WHERE {c["target_type"]} = %(kind)s AND {c["user"]} = %(user)s AND '
+                    f'{c["target"]} IN ({", ".join(str(int(pk)) for pk in removed)})',
+                    params
+                )
+            if upserted:
+                Vote.objects.bulk_create(
+                    upserted, update_conflicts=True,
+                    unique_fields=['target_type', 'target_id', 'user'], update_fields=['value']
+                )
+            bump_professor_content(professor_ids)
+        return results
+
+    def delete_target_votes(self, target_ids):
+        """
+        پاک کردن همه رأی‌های هدف‌های داده شده با یک DELETE مستقیم. QuerySet.delete برای
+        هر رأی post_delete می‌فرستد و رأی‌ها را یکی‌یکی در حافظه می‌آورد؛ هدف‌ها حذف
+        شده‌اند و شمارنده‌ای برای کاهش ندارند.
+        """
+        if not target_ids:
+            return
+        c = self._columns
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {c["vote_table"]} WHERE {c["target_type"]} = %(kind)s AND '
+                f'{c["target"]} IN ({", ".join(str(int(pk)) for pk in target_ids)})',
+                {'kind': self.kind}
+            )
+
+    def votes(self):
+        """رأی‌های این نوع هدف"""
+        return Vote.objects.filter(target_type=self.kind)
+
+    def user_votes(self, user, target_ids):
+        """رأی‌های کاربر به هدف‌های داده شده با یک کوئری IN روی ایندکس یکتای (نوع، هدف، کاربر): {target_id: value}"""
+        if not target_ids or not user.is_authenticated:
+            return {}
+        return dict(self.votes().filter(user=user, target_id__in=target_ids).values_list('target_id', 'value'))
+
+    def professor_ids(self, target_ids):
+        return self.target_model.objects.filter(pk__in=target_ids).values_list(self.professor_path, flat=True)
+
+    def subtract_counts(self, counts):
+        """کاهش شمارنده‌ها؛ counts: {target_id: (likes, dislikes)} با یک UPDATE برای هر دسته"""
+        target_ids = sorted(counts)
+        for offset in range(0, len(target_ids), SUBTRACT_CHUNK_SIZE):
+            chunk = target_ids[offset:offset + SUBTRACT_CHUNK_SIZE]
+
+            def decreased(field, position):
+                amount = Case(
+                    *[When(pk=pk, then=Value(counts[pk][position])) for pk in chunk],
+                    default=Value(0)
+                )
+                return Greatest(F(field) - amount, Value(0))
+
+            self.target_model.objects.filter(pk__in=chunk).update(
+                likes_count=decreased('likes_count', 0), dislikes_count=decreased('dislikes_count', 1)
+            )
+        bump_professor_content(self.professor_ids(target_ids))
+
+
+VOTE_KINDS = {}
+
+
+def register_vote_target(target_model, professor_path):
+    """
+    وصل کردن یک مدل هدف به موتور رأی (مثلاً register_vote_target(Question, 'professor')).
+    رأی‌های هدف با حذف آن پاک می‌شوند.
+    """
+    vote_kind = VoteKind(target_model, professor_path)
+    VOTE_KINDS[vote_kind.kind] = vote_kind
+    post_delete.connect(
+        delete_votes_on_target_delete, sender=target_model, dispatch_uid=f'delete_votes_{vote_kind.kind}'
+    )
+    return vote_kind
+
+
+register_vote_target(Review, 'professor')
+register_vote_target(Answer, 'question__professor')
+
+
+def subtract_vote_counts(deltas):
+    """
+    کاهش شمارنده‌ها برای رأی‌هایی که بیرون از موتور رأی حذف شده‌اند (مثلاً با
+    حذف آبشاری کاربر)؛ deltas: {(kind, target_id): (likes, dislikes)}
+    """
+    per_kind = {}
+    for (kind, target_id), counts in deltas.items():
+        per_kind.setdefault(kind, {})[target_id] = counts
+    for kind, counts in per_kind.items():
+        if kind in VOTE_KINDS:
+            VOTE_KINDS[kind].subtract_counts(counts)
+
+
+def toggle_vote(kind, target_id, user, value):
+    """
+    ثبت یک رأی (toggle).
+    خروجی: (likes_count, dislikes_count) جدید یا None اگر هدف وجود نداشته یا تأیید نشده باشد.
+    """
+    from .vote_buffer import active_vote_buffer
+    if active_vote_buffer() is not None:
+        result = apply_votes(user, [(kind, target_id, value)]).get((kind, target_id))
+    else:
+        result = VOTE_KINDS[kind].apply(user, {target_id: [value]}).get(target_id)
+    return result[:2] if result else None
+
+
+def user_votes(user, kind, target_ids):
+    """رأی‌های کاربر به هدف‌های داده شده (همراه رأی‌های بافر، اگر فعال باشد): {target_id: value}"""
+    from .vote_buffer import active_vote_buffer
+    votes = VOTE_KINDS[kind].user_votes(user, target_ids)
+    buffer = active_vote_buffer()
+    if buffer is not None:
+        votes = buffer.overlay(kind, user.pk, target_ids, votes)
+    return votes
+
+
+def apply_votes(user, operations):
+    """
+    رأی‌های دسته‌ای کاربر در یک تراکنش؛ operations: لیست (kind, target_id, value)
+    به ترتیب کلیک. برای هر نوع حداکثر سه دستور اجرا می‌شود. اگر بافر رأی فعال
+    باشد رأی‌ها فقط در بافر ثبت و بعداً دسته‌ای نوشته می‌شوند.
+    خروجی: {(kind, target_id): (likes_count, dislikes_count, رأی نهایی کاربر)}
+    """
+    from .vote_buffer import active_vote_buffer
+    if any(value not in VOTE_VALUES for kind, target_id, value in operations):
+        raise ValueError('رأی نامعتبر')
+    grouped = {}
+    for kind, target_id, value in operations:
+        grouped.setdefault(kind, {}).setdefault(target_id, []).append(value)
+
+    buffer = active_vote_buffer()
+    if buffer is not None:
+        return buffer.apply(user, grouped)
+
+    results = {}
+    with transaction.atomic():
+        for kind, kind_operations in grouped.items():
+            for target_id, result in VOTE_KINDS[kind].apply(user, kind_operations).items():
+                results[kind, target_id] = result
+    return results